@@ -0,0 +1,108 @@
+# === context_builder.py ===
+import os
+
+import pandas as pd
+
+# Rough budget for the data block of the response prompt (~4 characters per token)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CHARS_PER_TOKEN = 4
+
+DAILY_KPIS = {"NET SALES"}
+DAILY_COLUMNS = ["Daily Actual", "Daily Achievement %"]
+MTD_COLUMNS = ["Plan", "Actual"]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def kpi_columns(kpi: str, structured_query: dict) -> list:
+    """Columns the system prompt's KPI rules allow for this KPI."""
+    if kpi in DAILY_KPIS:
+        query = structured_query.get("user_query", "").lower()
+        wants_mtd = structured_query.get("mtd_mode") == "yes" or "plan vs actual" in query
+        return DAILY_COLUMNS + (MTD_COLUMNS if wants_mtd else [])
+    return MTD_COLUMNS
+
+
+def pivot_context(df: pd.DataFrame, structured_query: dict) -> pd.DataFrame:
+    """Long KPI rows → one row per (store, date) with a column per KPI metric."""
+    parts = []
+    for kpi, kpi_df in df.groupby("KPI Name", sort=True, observed=True):
+        cols = [c for c in kpi_columns(kpi, structured_query) if c in kpi_df.columns]
+        if not cols:
+            continue
+        long = kpi_df.melt(id_vars=["Store Name", "Date"], value_vars=cols, var_name="Metric", value_name="Value")
+        long["Metric"] = kpi + " " + long["Metric"]
+        parts.append(long)
+    if not parts:
+        return pd.DataFrame(columns=["Store Name", "Date"])
+
+    long = pd.concat(parts, ignore_index=True)
+    wide = long.pivot_table(index=["Store Name", "Date"], columns="Metric", values="Value", aggfunc="last", sort=False, observed=True)
+    wide = wide.reset_index().sort_values(by=["Store Name", "Date"])
+    wide.columns.name = None
+    return wide
+
+
+def _is_cumulative(metric: str) -> bool:
+    """MTD Plan/Actual are running totals, so a period is summarized by its last value."""
+    if any(metric.endswith(" " + c) for c in DAILY_COLUMNS):
+        return False
+    return any(metric.endswith(" " + c) for c in MTD_COLUMNS)
+
+
+def _summarize_older(store_df: pd.DataFrame, keep_days: int) -> pd.DataFrame:
+    """Collapse all but the last `keep_days` dates into one row (mean of daily values, last MTD value)."""
+    if len(store_df) <= keep_days:
+        return store_df
+    older, recent = store_df.iloc[:-keep_days], store_df.iloc[-keep_days:]
+    summary = {"Date": f"{older['Date'].iloc[0]}..{older['Date'].iloc[-1]} ({len(older)}d: avg daily, MTD at end)"}
+    for col in store_df.columns:
+        if col in ("Store Name", "Date"):
+            continue
+        summary[col] = older[col].iloc[-1] if _is_cumulative(col) else older[col].mean()
+    return pd.concat([pd.DataFrame([summary]), recent], ignore_index=True)
+
+
+def _render(wide: pd.DataFrame, keep_days: int = None) -> str:
+    blocks = []
+    for store, store_df in wide.groupby("Store Name", sort=False, observed=True):
+        store_df = store_df.drop(columns="Store Name").dropna(axis=1, how="all")
+        if keep_days is not None:
+            store_df = _summarize_older(store_df, keep_days)
+        blocks.append(f"### {store}\n" + store_df.to_csv(index=False, float_format="%.2f").strip())
+    return "\n\n".join(blocks)
+
+
+def build_compact_context(df: pd.DataFrame, structured_query: dict, token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Serialize retrieved KPI rows as a compact per-store CSV (date × KPI metric),
+    keeping only the columns the KPI rules use. If it exceeds `token_budget`,
+    older days are folded into a summary row, keeping as many recent days as fit.
+    """
+    if df.empty:
+        return "(no rows)"
+
+    wide = pivot_context(df, structured_query)
+    wide["Date"] = pd.to_datetime(wide["Date"]).dt.strftime("%Y-%m-%d")
+
+    text = _render(wide)
+    if estimate_tokens(text) <= token_budget:
+        return text
+
+    n_days = wide.groupby("Store Name", observed=True)["Date"].nunique().max()
+    lo, hi = 1, int(n_days) - 1
+    best = _render(wide, keep_days=1)
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        candidate = _render(wide, keep_days=mid)
+        if estimate_tokens(candidate) <= token_budget:
+            best, lo = candidate, mid + 1
+        else:
+            hi = mid - 1
+
+    if estimate_tokens(best) > token_budget:
+        cut = best[:token_budget * CHARS_PER_TOKEN]
+        best = cut[:cut.rfind("\n")] + "\n… (truncated to fit the context budget)"
+    return best
@@ -0,0 +1,231 @@
+# === data_loader.py ===
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+KPI_DATA_FILE = os.getenv("KPI_DATA_FILE", "data/kpi_precomputed.xlsx")
+ARROW_SUFFIXES = (".arrow", ".feather")
+
+# === Arrow IPC sidecar metadata keys ===
+_SOURCE_MTIME = b"source_mtime_ns"
+_SOURCE_SIZE = b"source_size"
+_SOURCE_SHA256 = b"source_sha256"
+
+
+def enable_copy_on_write():
+    """
+    Turn on pandas copy-on-write for this process (always on from pandas 3).
+
+    Called by the serving entry points (app.py, server.py, batch_runner.py),
+    not on import: slices of the shared KPI frame are views, and without
+    copy-on-write a write to one could reach the frame every session reads.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def columnar_cache_path(source_path: str) -> str:
+    return os.path.splitext(source_path)[0] + ".arrow"
+
+
+def appended_parts_dir(source_path: str) -> str:
+    """Directory of append-only Arrow parts written by the incremental precompute."""
+    return os.path.splitext(source_path)[0] + "_parts"
+
+
+def list_appended_parts(source_path: str) -> list:
+    parts_dir = appended_parts_dir(source_path)
+    if not os.path.isdir(parts_dir):
+        return []
+    return sorted(os.path.join(parts_dir, f) for f in os.listdir(parts_dir) if f.endswith(".arrow"))
+
+
+def _read_cache_metadata(cache_path: str) -> dict:
+    with pa.memory_map(cache_path, "r") as source:
+        schema = pa.ipc.open_file(source).schema
+    return schema.metadata or {}
+
+
+def _cache_is_fresh(source_path: str, cache_path: str) -> bool:
+    if not os.path.exists(cache_path):
+        return False
+    try:
+        meta = _read_cache_metadata(cache_path)
+    except (pa.ArrowInvalid, OSError):
+        return False
+
+    stat = os.stat(source_path)
+    if meta.get(_SOURCE_MTIME) == str(stat.st_mtime_ns).encode() and meta.get(_SOURCE_SIZE) == str(stat.st_size).encode():
+        return True
+    # mtime changed (copy/touch) — only rebuild if the content really changed
+    return meta.get(_SOURCE_SHA256) == _file_sha256(source_path).encode()
+
+
+def _arrow_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Arrow table whose float columns keep NaN as a value rather than a null,
+    so they have no validity bitmap and read back as zero-copy views.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, name in enumerate(table.column_names):
+        if df[name].dtype.kind == "f" and table.column(i).null_count:
+            field = table.schema.field(i)
+            table = table.set_column(i, field, pa.array(df[name].to_numpy(), type=field.type, from_pandas=False))
+    return table
+
+
+def write_arrow(df: pd.DataFrame, path: str, metadata: dict = None):
+    """Write an uncompressed (mmap-able) Arrow IPC file via write-then-rename."""
+    table = _arrow_table(df)
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+
+    # Concurrent readers/workers never see a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def _write_cache(df: pd.DataFrame, source_path: str, cache_path: str):
+    """Cache the frame already compact and sorted, so loading it needs no re-sort or copy."""
+    stat = os.stat(source_path)
+    write_arrow(compact_kpi_frame(df), cache_path, {
+        _SOURCE_MTIME: str(stat.st_mtime_ns).encode(),
+        _SOURCE_SIZE: str(stat.st_size).encode(),
+        _SOURCE_SHA256: _file_sha256(source_path).encode(),
+    })
+
+
+def load_columnar(cache_path: str, strings_to_categorical: bool = False) -> pd.DataFrame:
+    """
+    Memory-map an Arrow IPC file.
+
+    Columns are converted one block each (no consolidation), so numeric and
+    datetime columns without nulls stay zero-copy views of the read-only
+    mapping, and worker processes share those pages through the page cache.
+    Categorical codes, strings and columns with nulls are decoded into private
+    memory. Without `strings_to_categorical`, dictionary columns come back as plain strings.
+    """
+    with pa.memory_map(cache_path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    df = table.to_pandas(strings_to_categorical=strings_to_categorical, split_blocks=True)
+    if not strings_to_categorical:
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(df[col].cat.categories.dtype)
+    return df
+
+
+def load_kpi_data(path: str = KPI_DATA_FILE, compact: bool = False) -> pd.DataFrame:
+    """
+    Load the precomputed KPI workbook through an Arrow IPC cache.
+
+    The XLSX is parsed only when the cache is missing or the source changed
+    (checked by mtime/size, then content hash); otherwise the cache is mmapped.
+    Rows appended by the incremental precompute are concatenated after it.
+    An Arrow file path is memory-mapped directly. With `compact`, strings are
+    decoded straight to categoricals and the result goes through compact_kpi_frame.
+    """
+    if path.lower().endswith(ARROW_SUFFIXES):
+        df = load_columnar(path, compact)
+    else:
+        cache_path = columnar_cache_path(path)
+        if not _cache_is_fresh(path, cache_path):
+            print(f"🔄 Building columnar cache for {path}...")
+            df = pd.read_excel(path)
+            _write_cache(df, path, cache_path)
+        df = load_columnar(cache_path, compact)
+
+    parts = list_appended_parts(path)
+    if parts:
+        df = pd.concat([df] + [load_columnar(p, compact) for p in parts], ignore_index=True)
+    return compact_kpi_frame(df) if compact else df
+
+
+# === Compact, read-only in-memory representation ===
+CATEGORY_COLUMNS = ["Store Name", "KPI Name"]
+SORT_COLUMNS = ["Store Name", "KPI Name", "Date"]
+
+
+def _normalized_categorical(series: pd.Series) -> pd.Categorical:
+    """Strip/upper-case the labels and re-encode with sorted categories, touching each distinct label once."""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype("category")
+    labels = series.cat.categories.astype(str).str.strip().str.upper()
+    codes = series.cat.codes.to_numpy()
+    categories = sorted(set(labels))
+    if (codes < 0).any():  # missing names group as "NAN", as str() did before
+        categories = sorted(set(categories) | {"NAN"})
+    remap = pd.Index(categories).get_indexer(labels)
+    missing = pd.Index(categories).get_indexer(["NAN"])[0]
+    new_codes = np.where(codes >= 0, remap[codes] if len(remap) else codes, missing)
+    return pd.Categorical.from_codes(new_codes, categories=categories)
+
+
+def _downcast_numeric(series: pd.Series) -> pd.Series:
+    """Smallest dtype that holds every value exactly; floats stay float64 unless float32 round-trips."""
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return series
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return pd.to_numeric(series, downcast="integer")
+    if pd.api.types.is_float_dtype(series.dtype) and series.dtype != np.float32:
+        values = series.to_numpy()
+        narrow = values.astype(np.float32)
+        with np.errstate(over="ignore", invalid="ignore"):
+            if np.array_equal(narrow.astype(values.dtype), values, equal_nan=True):
+                return series.astype(np.float32)
+    return series
+
+
+def is_compact_kpi_frame(df: pd.DataFrame) -> bool:
+    """Already normalized, categorical, datetime64[ns] and sorted by (Store Name, KPI Name, Date)?"""
+    if not set(SORT_COLUMNS).issubset(df.columns) or df["Date"].dtype != "datetime64[ns]":
+        return False
+    for col in CATEGORY_COLUMNS:
+        dtype = df[col].dtype
+        if not isinstance(dtype, pd.CategoricalDtype) or not dtype.categories.is_monotonic_increasing:
+            return False
+        labels = dtype.categories.astype(str)
+        if not (labels == labels.str.strip().str.upper()).all():
+            return False
+    if len(df) < 2:
+        return True
+    stores = np.diff(df["Store Name"].cat.codes.to_numpy().astype(np.int64))
+    kpis = np.diff(df["KPI Name"].cat.codes.to_numpy().astype(np.int64))
+    dates = np.diff(df["Date"].to_numpy().view(np.int64))
+    return bool(((stores > 0) | ((stores == 0) & ((kpis > 0) | ((kpis == 0) & (dates >= 0))))).all())
+
+
+def compact_kpi_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalized copy of a KPI frame for sharing read-only across sessions.
+
+    Store/KPI names become upper-cased categoricals, Date is datetime64[ns],
+    numeric columns are downcast where lossless, and rows are sorted by
+    (Store Name, KPI Name, Date). A frame that is already compact is
+    returned as-is, so indexing it does not copy it again.
+    """
+    if is_compact_kpi_frame(df):
+        return df
+    frame = df.copy(deep=False)
+    frame["Date"] = pd.to_datetime(frame["Date"]).astype("datetime64[ns]")
+    for col in CATEGORY_COLUMNS:
+        frame[col] = _normalized_categorical(frame[col])
+    for col in frame.columns:
+        if col not in CATEGORY_COLUMNS and col != "Date":
+            frame[col] = _downcast_numeric(frame[col])
+    return frame.sort_values(by=SORT_COLUMNS, kind="stable", ignore_index=True)
+
@@ -0,0 +1,148 @@
+# === dataset.py ===
+import os
+import threading
+import time
+from typing import NamedTuple
+
+import pandas as pd
+
+from agents.data_loader import KPI_DATA_FILE, list_appended_parts, load_kpi_data
+from agents.kpi_index import KPIIndex, get_kpi_index
+from agents.partition_store import KPI_PARTITION_DIR, PartitionedKPIStore, manifest_path
+
+# Seconds between checks for a new precomputed file; 0 disables the background watcher
+DATASET_RELOAD_SECONDS = float(os.getenv("KPI_RELOAD_SECONDS", "60"))
+
+
+class DatasetSnapshot(NamedTuple):
+    df: pd.DataFrame  # None for a partitioned store: rows are loaded per query
+    index: KPIIndex  # or a PartitionedKPIStore
+    version: str
+    signature: tuple
+    loaded_at: float
+
+
+def source_signature(path: str) -> tuple:
+    """(mtime, size) of the data file and of every appended part (or of a partition manifest)."""
+    files = [manifest_path(path)] if os.path.isdir(path) else [path] + list_appended_parts(path)
+    signature = []
+    for f in files:
+        try:
+            stat = os.stat(f)
+        except FileNotFoundError:
+            continue
+        signature.append((os.path.basename(f), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class DatasetHolder:
+    """
+    Versioned, hot-reloadable KPI dataset.
+
+    `current()` returns an immutable snapshot (compact frame + index + version).
+    A request reads it once and keeps it, so a reload never changes data under
+    a request in flight. New data is loaded off the request path and swapped in
+    with a single reference assignment; listeners registered with
+    `on_swap(fn)` are then called with (old, new) to drop version-keyed caches.
+    """
+
+    def __init__(self, path: str = KPI_DATA_FILE, poll_seconds: float = DATASET_RELOAD_SECONDS):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self._snapshot = None
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self.reload()
+
+    def current(self) -> DatasetSnapshot:
+        return self._snapshot
+
+    def on_swap(self, fn):
+        """Register fn(old_snapshot, new_snapshot), called after every version change."""
+        self._listeners.append(fn)
+        return fn
+
+    def _load(self, signature: tuple) -> DatasetSnapshot:
+        if os.path.isdir(self.path):
+            store = PartitionedKPIStore(self.path)
+            return DatasetSnapshot(None, store, store.version, signature, time.time())
+        df = load_kpi_data(self.path, compact=True)
+        index = get_kpi_index(df)
+        return DatasetSnapshot(df, index, index.version, signature, time.time())
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Load the data file if it changed since the current snapshot (or `force`).
+        Returns True when a new version was swapped in. On a failed or torn
+        read the current snapshot stays in place.
+        """
+        with self._reload_lock:
+            old = self._snapshot
+            signature = source_signature(self.path)
+            if old is not None and not force and signature == old.signature:
+                return False
+
+            started = time.perf_counter()
+            new = self._load(signature)
+            if source_signature(self.path) != signature:
+                # File still being written; try again on the next poll
+                print(f"⚠️ {self.path} changed while loading, keeping version {old.version[:12] if old else None}")
+                if old is not None:
+                    return False
+                new = self._load(source_signature(self.path))
+
+            if old is not None and new.version == old.version:
+                self._snapshot = old._replace(signature=new.signature)  # touched, same content
+                return False
+
+            self._snapshot = new
+            print(f"✅ Loaded KPI dataset version {new.version[:12]} "
+                  f"({len(new.index):,} rows) in {time.perf_counter() - started:.2f}s")
+
+        if old is not None:
+            for fn in list(self._listeners):
+                try:
+                    fn(old, new)
+                except Exception as e:
+                    print(f"⚠️ Dataset swap listener {getattr(fn, '__name__', fn)} failed: {e}")
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"❌ Reloading {self.path} failed, keeping current version: {e}")
+
+    def start_watching(self):
+        """Poll for new data on a daemon thread (no-op when polling is disabled or already running)."""
+        if self.poll_seconds <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="kpi-dataset-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+
+# === One holder per data file per process ===
+_holders = {}
+_holders_lock = threading.Lock()
+
+def get_dataset(path: str = KPI_PARTITION_DIR or KPI_DATA_FILE) -> DatasetHolder:
+    """
+    The process-wide holder for `path`, loaded on first use and shared by every session.
+    A directory is read as a partitioned store (see partition_store.py).
+    """
+    with _holders_lock:
+        holder = _holders.get(path)
+        if holder is None:
+            holder = DatasetHolder(path)
+            _holders[path] = holder
+        return holder
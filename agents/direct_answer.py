@@ -0,0 +1,120 @@
+# === direct_answer.py ===
+import os
+import re
+
+import pandas as pd
+
+from schemas import KPIResponse
+from agents.context_builder import DAILY_KPIS
+from agents.retrieval_agent_node import normalize_kpis
+
+# DIRECT_ANSWERS=0 sends every query to the response LLM again
+DIRECT_ANSWERS = os.getenv("DIRECT_ANSWERS", "1").lower() in ("1", "true", "yes")
+# A lookup answers at most this many (store, KPI) values; anything larger is an analysis
+DIRECT_MAX_VALUES = int(os.getenv("DIRECT_MAX_VALUES", "6"))
+
+# Wording that asks for reasoning rather than a number
+ANALYSIS_RE = re.compile(
+    r"\b(why|trend|trends|trending|compare|comparison|analy[sz]e|analysis|explain|reason|reasons|"
+    r"insight|insights|summary|summari[sz]e|performance|performing|doing|driver|drivers|cause|caused|improve)\b"
+)
+PLAN_RE = re.compile(r"\b(plan|target)\b")
+
+
+def lookup_target(structured: dict, user_query: str):
+    """
+    (mode, date) when the query is a plain value lookup, else None.
+
+    mode is "daily" for one named date, "mtd" for month-to-date values as of
+    the end of the requested range.
+    """
+    if not DIRECT_ANSWERS or ANALYSIS_RE.search(user_query.lower()):
+        return None
+    if not structured.get("mentioned_kpis"):
+        return None
+    strategy = structured.get("retrieval_strategy")
+    dates = structured.get("important_dates") or []
+    mtd = structured.get("mtd_mode") == "yes"
+
+    if strategy == "single_date_analysis" and len(dates) == 1:
+        return ("mtd" if mtd else "daily"), pd.Timestamp(dates[0])
+    if mtd and strategy == "full_range" and not dates and structured.get("end_date"):
+        return "mtd", pd.Timestamp(structured["end_date"])
+    return None
+
+
+def compute_kpi_responses(df: pd.DataFrame, structured: dict, mode: str, target: pd.Timestamp):
+    """
+    [(store, date, KPIResponse, daily)] read straight from the precomputed columns,
+    or None when any requested value is missing or there are too many of them.
+    """
+    kpis = list(dict.fromkeys(normalize_kpis(structured["mentioned_kpis"])))
+    rows = df[df["KPI Name"].isin(kpis) & (df["Date"] <= target)]
+    if rows.empty:
+        return None
+    if mode == "daily":
+        rows = rows[rows["Date"] == target]
+    else:
+        # MTD values are running totals: the latest row of the month up to the target date
+        rows = rows[rows["Date"] >= target.replace(day=1)]
+        rows = rows.sort_values("Date").groupby(["Store Name", "KPI Name"], observed=True).tail(1)
+
+    stores = list(dict.fromkeys(str(s) for s in df["Store Name"]))
+    if len(stores) * len(kpis) > DIRECT_MAX_VALUES or len(rows) != len(stores) * len(kpis):
+        return None
+
+    results = []
+    for r in rows.to_dict("records"):
+        kpi = str(r["KPI Name"])
+        daily = mode == "daily" and kpi in DAILY_KPIS
+        if daily:
+            plan, actual, achievement = r["Daily Plan"], r["Daily Actual"], r["Daily Achievement %"]
+        else:
+            plan, actual = r["Plan"], r["Actual"]
+            achievement = round(actual / plan * 100, 2) if plan else None
+        if pd.isna(actual):
+            return None
+        achievement = None if achievement is None or pd.isna(achievement) else float(achievement)
+        response = KPIResponse(kpi=kpi, plan=float(plan), actual=float(actual), achievement_percent=achievement)
+        results.append((str(r["Store Name"]), pd.Timestamp(r["Date"]), response, daily))
+
+    order = {s: i for i, s in enumerate(stores)}
+    kpi_order = {k: i for i, k in enumerate(kpis)}
+    return sorted(results, key=lambda x: (order[x[0]], kpi_order.get(x[2].kpi, 0)))
+
+
+def render_direct_answer(results: list, show_plan: bool) -> str:
+    lines = []
+    current = None
+    for store, day, response, daily in results:
+        if store != current:
+            if lines:
+                lines.append("")
+            lines.append(f"**{store}**")
+            current = store
+        label = f"{response.kpi.title()} ({'daily' if daily else 'MTD'}, {day.strftime('%d %b %Y')})"
+        parts = [f"actual {response.actual:,.2f}"]
+        if (show_plan or not daily) and not pd.isna(response.plan):
+            parts.append(f"plan {response.plan:,.2f}")
+        if response.achievement_percent is not None:
+            parts.append(f"achievement {response.achievement_percent:.2f}%")
+        lines.append(f"- {label}: " + " · ".join(parts))
+    lines.append("")
+    lines.append("_Values read directly from the precomputed KPI table._")
+    return "\n".join(lines)
+
+
+def direct_answer(state: dict):
+    """Templated answer for a plain lookup (no LLM call), or None when the query needs generation."""
+    df = state.get("context_df")
+    structured = state.get("structured") or {}
+    if df is None or df.empty:
+        return None
+    user_query = state.get("user_query", "")
+    target = lookup_target(structured, user_query)
+    if target is None:
+        return None
+    results = compute_kpi_responses(df, structured, *target)
+    if not results:
+        return None
+    return render_direct_answer(results, show_plan=bool(PLAN_RE.search(user_query.lower())))
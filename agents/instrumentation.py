@@ -0,0 +1,196 @@
+# === instrumentation.py ===
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# KPI_DEBUG=1 turns the per-node debug dumps back on; off by default
+DEBUG_DUMPS = os.getenv("KPI_DEBUG", "0").lower() in ("1", "true", "yes")
+# KPI_TRACE_FILE=path appends one JSON line per node execution
+TRACE_FILE = os.getenv("KPI_TRACE_FILE")
+
+WALL_MS_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 60000]
+COUNT_BUCKETS = [0, 10, 100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+def debug_print(*args, **kwargs):
+    if DEBUG_DUMPS:
+        print(*args, **kwargs)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.n += 1
+
+    def quantile(self, q: float):
+        """Upper bucket bound containing the q-quantile (None if empty)."""
+        if not self.n:
+            return None
+        target = q * self.n
+        seen = 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """In-process histograms and counters keyed by (metric, node)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = defaultdict(float)
+
+    def observe(self, metric: str, node: str, value: float, buckets=WALL_MS_BUCKETS):
+        with self._lock:
+            key = (metric, node)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def inc(self, metric: str, labels: tuple, value: float = 1):
+        with self._lock:
+            self.counters[(metric, labels)] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            hist = {
+                f"{metric}{{node={node}}}": {
+                    "count": h.n, "sum": round(h.total, 3), "mean": round(h.total / h.n, 3) if h.n else None,
+                    "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99),
+                }
+                for (metric, node), h in self.histograms.items()
+            }
+            counters = {f"{metric}{{{','.join(f'{k}={v}' for k, v in labels)}}}": value
+                        for (metric, labels), value in self.counters.items()}
+        return {"histograms": hist, "counters": counters}
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for (metric, node), h in sorted(self.histograms.items()):
+                name = f"kpi_{metric}"
+                cumulative = 0
+                for bound, count in zip(h.buckets + ["+Inf"], h.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{node="{node}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{node="{node}"}} {h.total}')
+                lines.append(f'{name}_count{{node="{node}"}} {h.n}')
+            for (metric, labels), value in sorted(self.counters.items()):
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"kpi_{metric}_total{{{label_str}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+metrics = Metrics()
+_trace_lock = threading.Lock()
+_current_span = ContextVar("kpi_node_span", default=None)
+
+
+class NodeSpan:
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.fields = {}
+
+    def annotate(self, **fields):
+        self.fields.update({k: v for k, v in fields.items() if v is not None})
+
+    def finish(self):
+        wall_ms = (time.perf_counter() - self.started) * 1000
+        metrics.observe("wall_ms", self.name, wall_ms)
+        for key in ("rows_in", "rows_out"):
+            if key in self.fields:
+                metrics.observe(key, self.name, self.fields[key], COUNT_BUCKETS)
+        for key in ("prompt_tokens", "completion_tokens"):
+            if key in self.fields:
+                metrics.inc(key, (("node", self.name),), self.fields[key])
+        if "cache" in self.fields:
+            metrics.inc("cache_lookups", (("node", self.name), ("result", self.fields["cache"])))
+        if "path" in self.fields:
+            metrics.inc("classification_path", (("path", self.fields["path"]),))
+        if "error" in self.fields:
+            metrics.inc("errors", (("node", self.name),))
+
+        if TRACE_FILE:
+            record = {"ts": time.time(), "node": self.name, "wall_ms": round(wall_ms, 3), **self.fields}
+            with _trace_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        return wall_ms
+
+
+def annotate(**fields):
+    """Attach fields (rows, tokens, cache result, ...) to the node currently running, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span.annotate(**fields)
+
+
+def record_usage(response):
+    """Annotate the current node with an OpenAI response's token usage."""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        annotate(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+
+
+@contextmanager
+def node_span(name: str):
+    span = NodeSpan(name)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.annotate(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        span.finish()
+
+
+@contextmanager
+def active_span(span: NodeSpan):
+    """Make `span` current for a block (without finishing it), e.g. between yields of a stream."""
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+def instrument_node(name: str):
+    """Wrap a LangGraph node (sync or async) so every call records a span."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(state, *args, **kwargs):
+                with node_span(name):
+                    return await fn(state, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(state, *args, **kwargs):
+            with node_span(name):
+                return fn(state, *args, **kwargs)
+        return wrapper
+    return decorator
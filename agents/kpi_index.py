@@ -0,0 +1,127 @@
+# === kpi_index.py ===
+import hashlib
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from agents.data_loader import compact_kpi_frame
+from agents.store_resolver import StoreResolver
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Order-sensitive content hash of a frame (values and column names)."""
+    digest = hashlib.sha256("|".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class KPIIndex:
+    """
+    Read-only index over the precomputed KPI frame.
+
+    The frame is held in compact form (see compact_kpi_frame), normalized and
+    sorted by (Store Name, KPI Name, Date); a frame that is already compact is
+    used by reference, not copied. Every (store, KPI) pair maps to a contiguous
+    row range, so a query only touches the groups it asks for and
+    binary-searches dates inside them.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        frame = compact_kpi_frame(df)
+
+        self._frame = frame
+        self._dates = frame["Date"].to_numpy()
+        self._groups = {}
+        self._store_kpis = {}
+
+        store_codes = frame["Store Name"].cat.codes.to_numpy()
+        kpi_codes = frame["KPI Name"].cat.codes.to_numpy()
+        store_labels = frame["Store Name"].cat.categories
+        kpi_labels = frame["KPI Name"].cat.categories
+        if len(frame):
+            change = np.flatnonzero((store_codes[1:] != store_codes[:-1]) | (kpi_codes[1:] != kpi_codes[:-1])) + 1
+            starts = np.concatenate(([0], change))
+            ends = np.concatenate((change, [len(frame)]))
+            for lo, hi in zip(starts.tolist(), ends.tolist()):
+                key = (store_labels[store_codes[lo]], kpi_labels[kpi_codes[lo]])
+                self._groups[key] = (lo, hi)
+                self._store_kpis.setdefault(key[0], []).append(key[1])
+
+        self.stores = list(self._store_kpis)
+        self.kpis = sorted({kpi for _, kpi in self._groups})
+
+    # Built on first use: partition indexes (see partition_store) never need them
+    @cached_property
+    def resolver(self) -> StoreResolver:
+        return StoreResolver(self.stores)
+
+    @cached_property
+    def version(self) -> str:
+        """Content hash of the whole dataset; version-keyed caches miss once it changes."""
+        return frame_fingerprint(self._frame)
+
+    def __len__(self):
+        return len(self._frame)
+
+    @property
+    def columns(self):
+        return self._frame.columns
+
+    def match_stores(self, store_names, threshold=None):
+        return self.resolver.match(store_names, threshold)
+
+    def _date_slice(self, lo, hi, start=None, end=None):
+        dates = self._dates[lo:hi]
+        left = lo + int(np.searchsorted(dates, start, side="left")) if start is not None else lo
+        right = lo + int(np.searchsorted(dates, end, side="right")) if end is not None else hi
+        return left, right
+
+    def select(self, stores=None, kpis=None, start=None, end=None, dates=None) -> pd.DataFrame:
+        """
+        Return rows for the given stores/KPIs (None = all) within [start, end]
+        or, when `dates` is given, on exactly those dates. Sorted by Store Name, Date.
+        """
+        store_list = self.stores if stores is None else [s for s in dict.fromkeys(stores) if s in self._store_kpis]
+        kpi_filter = None if kpis is None else set(kpis)
+        start = np.datetime64(pd.Timestamp(start), "ns") if start is not None else None
+        end = np.datetime64(pd.Timestamp(end), "ns") if end is not None else None
+        exact = None
+        if dates is not None:
+            exact = np.unique(pd.to_datetime(list(dates)).to_numpy(dtype="datetime64[ns]"))
+
+        ranges = []
+        for store in store_list:
+            for kpi in self._store_kpis[store]:
+                if kpi_filter is not None and kpi not in kpi_filter:
+                    continue
+                lo, hi = self._groups[(store, kpi)]
+                if exact is not None:
+                    group_dates = self._dates[lo:hi]
+                    left = np.searchsorted(group_dates, exact, side="left")
+                    right = np.searchsorted(group_dates, exact, side="right")
+                    ranges.extend((lo + int(a), lo + int(b)) for a, b in zip(left, right) if b > a)
+                else:
+                    left, right = self._date_slice(lo, hi, start, end)
+                    if right > left:
+                        ranges.append((left, right))
+
+        if not ranges:
+            return self._frame.iloc[0:0]
+        if len(ranges) == 1:
+            return self._frame.iloc[ranges[0][0]:ranges[0][1]]  # one (store, KPI) run: a view, already in order
+        positions = np.concatenate([np.arange(a, b) for a, b in ranges])
+        result = self._frame.iloc[positions]
+        return result.sort_values(by=["Store Name", "Date"], kind="stable")
+
+
+# === Build-once cache keyed on the loaded frame ===
+_index_cache = {}
+
+def get_kpi_index(df: pd.DataFrame) -> KPIIndex:
+    cached = _index_cache.get("frame")
+    if cached is not None and cached[0] is df:
+        return cached[1]
+    index = KPIIndex(df)
+    _index_cache["frame"] = (df, index)
+    return index
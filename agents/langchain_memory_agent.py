@@ -1,21 +1,33 @@
-from langchain.memory import ConversationBufferMemory
+import os
 
-# Initialize memory
-chat_memory = ConversationBufferMemory(
-    memory_key="chat_history",
-    return_messages=True
-)
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agents.context_builder import estimate_tokens
+from agents.memory_logger import DEFAULT_SESSION, MemoryLogger
+
+# Token budget for the history window handed back to a prompt
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+
+# Initialize memory: per-session ring buffers, spilled to the on-disk interaction log
+chat_memory = MemoryLogger(max_entries_per_session=50)
 
 # Log a query/response pair
-def log_to_memory(user_query: str, bot_response: str):
-    chat_memory.chat_memory.add_user_message(user_query)
-    chat_memory.chat_memory.add_ai_message(bot_response)
+def log_to_memory(user_query: str, bot_response: str, session_id: str = DEFAULT_SESSION):
+    chat_memory.log_interaction(user_query, final_response=bot_response, session_id=session_id)
 
-# Retrieve the entire memory history
-def get_chat_history():
-    memory = chat_memory.load_memory_variables({})
-    return memory.get("chat_history", "")
+# Retrieve the most recent history that fits the token budget (oldest first)
+def get_chat_history(session_id: str = DEFAULT_SESSION, token_budget: int = CHAT_HISTORY_TOKEN_BUDGET):
+    window = []
+    used = 0
+    for entry in reversed(chat_memory.get_recent_logs(chat_memory.max_entries_per_session, session_id)):
+        pair = [HumanMessage(content=entry["user_query"]), AIMessage(content=entry["final_response"] or "")]
+        cost = sum(estimate_tokens(m.content) for m in pair)
+        if used + cost > token_budget:
+            break
+        window[:0] = pair
+        used += cost
+    return window
 
 # Clear memory (if needed)
-def reset_memory():
-    chat_memory.clear()
+def reset_memory(session_id: str = None):
+    chat_memory.clear_logs(session_id)
@@ -0,0 +1,189 @@
+# === llm_backends.py ===
+# Pluggable chat-completion backends. Pick one per role with an env var:
+#   CLASSIFIER_BACKEND=openai (default) | llama_cpp | stub
+#   LLAMA_MODEL_PATH=models/qwen2.5-0.5b-instruct-q4_k_m.gguf   (for llama_cpp)
+#   LLAMA_CHAT_FORMAT=chatml                                      (must match the model's prompt template)
+import asyncio
+import json
+import os
+import threading
+from typing import NamedTuple
+
+from agents.llm_clients import get_async_client, llm_slot
+
+LLAMA_MODEL_PATH = os.getenv("LLAMA_MODEL_PATH", "models/classifier.gguf")
+LLAMA_N_CTX = int(os.getenv("LLAMA_N_CTX", "2048"))
+LLAMA_N_THREADS = int(os.getenv("LLAMA_N_THREADS", "0")) or None  # None = llama.cpp default
+LLAMA_N_GPU_LAYERS = int(os.getenv("LLAMA_N_GPU_LAYERS", "0"))
+# llama-cpp-python 0.2.24 does not read the chat template from the GGUF, so the format is explicit;
+# "chatml" fits Qwen-family models, set LLAMA_CHAT_FORMAT for others (e.g. "llama-2", "zephyr")
+LLAMA_CHAT_FORMAT = os.getenv("LLAMA_CHAT_FORMAT") or "chatml"
+
+
+class LLMResult(NamedTuple):
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class LLMBackend:
+    """
+    One chat-completion call: `complete(messages, ...)` → LLMResult.
+
+    `json_schema`, when given, is a JSON Schema the reply must follow; backends
+    that can enforce it do (llama.cpp grammar), the others rely on the prompt.
+    The async variant runs the sync call in a worker thread unless overridden.
+    """
+
+    name = "base"
+
+    def complete(self, messages: list, max_tokens: int = 512, temperature: float = 0.0,
+                 json_schema: dict = None) -> LLMResult:
+        raise NotImplementedError
+
+    async def acomplete(self, messages: list, max_tokens: int = 512, temperature: float = 0.0,
+                        json_schema: dict = None) -> LLMResult:
+        return await asyncio.to_thread(self.complete, messages, max_tokens, temperature, json_schema)
+
+
+class OpenAIBackend(LLMBackend):
+    """Remote OpenAI-compatible API (honors OPENAI_BASE_URL); async calls share the pooled client."""
+
+    name = "openai"
+
+    def __init__(self, model: str):
+        from openai import OpenAI
+        from langsmith.wrappers import wrap_openai
+        self.model = model
+        self.client = wrap_openai(OpenAI(api_key=os.getenv("OPENAI_API_KEY")))
+
+    @staticmethod
+    def _result(response) -> LLMResult:
+        usage = getattr(response, "usage", None)
+        return LLMResult(
+            response.choices[0].message.content,
+            usage.prompt_tokens if usage is not None else 0,
+            usage.completion_tokens if usage is not None else 0,
+        )
+
+    def complete(self, messages, max_tokens=512, temperature=0.0, json_schema=None):
+        response = self.client.chat.completions.create(
+            model=self.model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+        )
+        return self._result(response)
+
+    async def acomplete(self, messages, max_tokens=512, temperature=0.0, json_schema=None):
+        async with llm_slot():
+            response = await get_async_client().chat.completions.create(
+                model=self.model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+            )
+        return self._result(response)
+
+
+class LlamaCppBackend(LLMBackend):
+    """
+    Quantized GGUF model run in-process by llama-cpp-python.
+
+    The model is loaded once and warmed with a one-token completion, so the
+    first real request does not pay for page-faulting the weights. A llama.cpp
+    context is not thread-safe, so calls are serialized with a lock (async
+    callers wait in a worker thread, not on the event loop). A `json_schema`
+    is compiled once into a GBNF grammar that constrains decoding to it.
+    """
+
+    name = "llama_cpp"
+
+    def __init__(self, model_path: str = LLAMA_MODEL_PATH, n_ctx: int = LLAMA_N_CTX,
+                 n_threads: int = LLAMA_N_THREADS, n_gpu_layers: int = LLAMA_N_GPU_LAYERS,
+                 chat_format: str = LLAMA_CHAT_FORMAT, warm: bool = True):
+        from llama_cpp import Llama
+
+        print(f"🔄 Loading local model {model_path}...")
+        self.model_path = model_path
+        self._llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads,
+                          n_gpu_layers=n_gpu_layers, chat_format=chat_format, verbose=False)
+        self._lock = threading.Lock()
+        self._grammars = {}
+        if warm:
+            self.complete([{"role": "user", "content": "ok"}], max_tokens=1)
+
+    def _grammar(self, json_schema: dict):
+        from llama_cpp.llama_grammar import LlamaGrammar, json_schema_to_gbnf
+
+        key = json.dumps(json_schema)
+        grammar = self._grammars.get(key)
+        if grammar is None:
+            grammar = LlamaGrammar.from_string(json_schema_to_gbnf(key), verbose=False)
+            self._grammars[key] = grammar
+        return grammar
+
+    def complete(self, messages, max_tokens=512, temperature=0.0, json_schema=None):
+        with self._lock:
+            grammar = self._grammar(json_schema) if json_schema else None
+            response = self._llm.create_chat_completion(
+                messages=messages, max_tokens=max_tokens, temperature=temperature, grammar=grammar,
+            )
+        usage = response.get("usage") or {}
+        return LLMResult(
+            response["choices"][0]["message"]["content"] or "",
+            usage.get("prompt_tokens", 0),
+            usage.get("completion_tokens", 0),
+        )
+
+
+class StubBackend(LLMBackend):
+    """
+    Deterministic offline backend for tests and local runs: no network, no model.
+
+    `responder(messages)` returns the reply text; without one, `default` is returned.
+    Every call is recorded in `calls`.
+    """
+
+    name = "stub"
+
+    def __init__(self, responder=None, default: str = ""):
+        self.responder = responder
+        self.default = default
+        self.calls = []
+
+    def complete(self, messages, max_tokens=512, temperature=0.0, json_schema=None):
+        self.calls.append(messages)
+        text = self.responder(messages) if self.responder is not None else self.default
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+        return LLMResult(text, prompt_chars // 4 + 1, len(text) // 4 + 1)
+
+    async def acomplete(self, messages, max_tokens=512, temperature=0.0, json_schema=None):
+        return self.complete(messages, max_tokens, temperature, json_schema)
+
+
+# === Backend per role, built once per process ===
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(role: str, default_model: str, stub_factory=None) -> LLMBackend:
+    """
+    The backend for `role` (e.g. "classifier"), chosen by the <ROLE>_BACKEND env var.
+
+    `stub_factory()` builds the role's StubBackend, so each role can supply
+    canned replies that fit its own output format.
+    """
+    with _backends_lock:
+        backend = _backends.get(role)
+        if backend is None:
+            kind = os.getenv(f"{role.upper()}_BACKEND", "openai").lower()
+            if kind == "openai":
+                backend = OpenAIBackend(os.getenv(f"{role.upper()}_MODEL", default_model))
+            elif kind in ("llama_cpp", "llama.cpp", "llama"):
+                backend = LlamaCppBackend(os.getenv(f"{role.upper()}_LLAMA_MODEL_PATH", LLAMA_MODEL_PATH))
+            elif kind == "stub":
+                backend = stub_factory() if stub_factory is not None else StubBackend()
+            else:
+                raise ValueError(f"❌ Unknown {role} backend: {kind}")
+            _backends[role] = backend
+        return backend
+
+
+def set_backend(role: str, backend: LLMBackend):
+    """Replace the backend for `role` (e.g. a StubBackend in tests)."""
+    with _backends_lock:
+        _backends[role] = backend
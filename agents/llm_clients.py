@@ -0,0 +1,49 @@
+# === llm_clients.py ===
+import asyncio
+import os
+
+import httpx
+from openai import AsyncOpenAI
+from langsmith.wrappers import wrap_openai
+
+# Upper bound on in-flight upstream LLM calls per process (async paths)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+_async_client = None
+_semaphore = None
+
+
+def get_async_client():
+    """
+    Process-wide AsyncOpenAI client over one pooled httpx connection pool.
+
+    Honors OPENAI_BASE_URL, so the service can be pointed at a local stub.
+    """
+    global _async_client
+    if _async_client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=LLM_MAX_CONCURRENCY * 2, max_keepalive_connections=LLM_MAX_CONCURRENCY),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+        _async_client = wrap_openai(AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            http_client=http_client,
+        ))
+    return _async_client
+
+
+def llm_slot() -> asyncio.Semaphore:
+    """Semaphore every async LLM call acquires; created on the running event loop."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def close_async_client():
+    global _async_client, _semaphore
+    if _async_client is not None:
+        await _async_client.close()
+    _async_client = None
+    _semaphore = None
@@ -1,9 +1,62 @@
+from collections import OrderedDict, deque
 from datetime import datetime
+import json
+import os
+import sqlite3
+import threading
 import uuid
 
+LOG_DB_FILE = os.getenv("INTERACTION_LOG_DB", "data/logs/interactions.sqlite3")
+DEFAULT_SESSION = "default"
+
 class MemoryLogger:
-    def __init__(self):
-        self.logs = []  # Stores all memory objects
+    """
+    Interaction log with bounded memory use.
+
+    Recent entries live in a per-session ring buffer (at most
+    `max_entries_per_session` each, at most `max_sessions` sessions kept, least
+    recently used dropped first). Every entry is also appended to SQLite with
+    an FTS5 index, so search and export work over the full history on disk.
+    """
+
+    def __init__(self, path: str = LOG_DB_FILE, max_entries_per_session: int = 200,
+                 max_sessions: int = 1000, persistent: bool = True):
+        self.max_entries_per_session = max_entries_per_session
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id → deque of recent entries
+        self._lock = threading.Lock()
+        self._db = None
+        self._fts = False
+        if persistent:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS interactions ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT, session_id TEXT, timestamp TEXT,"
+                " user_query TEXT, final_response TEXT, entry TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS interactions_session ON interactions(session_id, seq)")
+            try:
+                self._db.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS interactions_fts USING fts5("
+                    " user_query, content='interactions', content_rowid='seq')"
+                )
+                self._fts = True
+            except sqlite3.OperationalError:
+                self._fts = False  # SQLite built without FTS5 → LIKE scan
+            self._db.commit()
+
+    def _ring(self, session_id: str) -> deque:
+        ring = self._sessions.get(session_id)
+        if ring is None:
+            ring = deque(maxlen=self.max_entries_per_session)
+            self._sessions[session_id] = ring
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return ring
 
     def log_interaction(
         self,
@@ -12,10 +65,12 @@ class MemoryLogger:
         code: str = None,
         result_df_sample: str = None,
         final_response: str = None,
-        path_used: str = None  # "precomputed" or "exec"
+        path_used: str = None,  # "precomputed" or "exec"
+        session_id: str = DEFAULT_SESSION
     ):
         log_entry = {
             "id": str(uuid.uuid4()),
+            "session_id": session_id,
             "timestamp": datetime.now().isoformat(),
             "user_query": user_query,
             "structured_query": structured_query,
@@ -24,17 +79,89 @@ class MemoryLogger:
             "result_sample": result_df_sample,
             "final_response": final_response
         }
-        self.logs.append(log_entry)
+        with self._lock:
+            self._ring(session_id).append(log_entry)
+            if self._db is not None:
+                cur = self._db.execute(
+                    "INSERT INTO interactions (id, session_id, timestamp, user_query, final_response, entry)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (log_entry["id"], session_id, log_entry["timestamp"], user_query, final_response,
+                     json.dumps(log_entry, default=str)),
+                )
+                if self._fts:
+                    self._db.execute(
+                        "INSERT INTO interactions_fts (rowid, user_query) VALUES (?, ?)", (cur.lastrowid, user_query)
+                    )
+                self._db.commit()
+        return log_entry
+
+    def get_recent_logs(self, n=5, session_id: str = DEFAULT_SESSION):
+        with self._lock:
+            ring = self._sessions.get(session_id, ())
+            return list(ring)[-n:]
+
+    def search_by_query(self, keyword, session_id: str = None, limit: int = 100):
+        """Keyword search over every logged query (FTS5 prefix match on disk, else a ring-buffer scan)."""
+        if self._db is None:
+            with self._lock:
+                rings = [self._sessions.get(session_id, ())] if session_id else list(self._sessions.values())
+                hits = [log for ring in rings for log in ring if keyword.lower() in log["user_query"].lower()]
+            return hits[-limit:]
+
+        params = []
+        if self._fts:
+            terms = [t.replace('"', '""') for t in keyword.split()]
+            sql = ("SELECT i.entry FROM interactions_fts f JOIN interactions i ON i.seq = f.rowid"
+                   " WHERE interactions_fts MATCH ?")
+            params.append(" ".join(f'"{t}"*' for t in terms) or '""')
+        else:
+            sql = "SELECT i.entry FROM interactions i WHERE lower(i.user_query) LIKE ?"
+            params.append(f"%{keyword.lower()}%")
+        if session_id:
+            sql += " AND i.session_id = ?"
+            params.append(session_id)
+        sql += " ORDER BY i.seq DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [json.loads(r[0]) for r in reversed(rows)]
 
-    def get_recent_logs(self, n=5):
-        return self.logs[-n:]
+    def clear_logs(self, session_id: str = None, purge: bool = False):
+        """Drop in-memory entries (one session or all); `purge` also deletes them from disk."""
+        with self._lock:
+            if session_id:
+                self._sessions.pop(session_id, None)
+            else:
+                self._sessions.clear()
+            if purge and self._db is not None:
+                where, params = ("WHERE session_id = ?", (session_id,)) if session_id else ("", ())
+                if self._fts:
+                    self._db.execute(f"DELETE FROM interactions_fts WHERE rowid IN (SELECT seq FROM interactions {where})", params)
+                self._db.execute(f"DELETE FROM interactions {where}", params)
+                self._db.commit()
 
-    def search_by_query(self, keyword):
-        return [log for log in self.logs if keyword.lower() in log["user_query"].lower()]
-    
-    def clear_logs(self):
-        self.logs = []
+    def export_logs(self, session_id: str = None, batch_size: int = 500):
+        """Yield logged entries oldest-first, streamed from disk in batches (can be written to CSV/JSON)."""
+        if self._db is None:
+            with self._lock:
+                rings = [self._sessions.get(session_id, ())] if session_id else list(self._sessions.values())
+                entries = [log for ring in rings for log in ring]
+            yield from entries
+            return
 
-    def export_logs(self):
-        """Return logs as list of dicts (can be written to CSV/JSON if needed)."""
-        return self.logs
\ No newline at end of file
+        last_seq = 0
+        while True:
+            sql = "SELECT seq, entry FROM interactions WHERE seq > ?"
+            params = [last_seq]
+            if session_id:
+                sql += " AND session_id = ?"
+                params.append(session_id)
+            sql += " ORDER BY seq LIMIT ?"
+            params.append(batch_size)
+            with self._lock:
+                rows = self._db.execute(sql, params).fetchall()
+            if not rows:
+                return
+            for seq, entry in rows:
+                yield json.loads(entry)
+            last_seq = rows[-1][0]
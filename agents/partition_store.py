@@ -0,0 +1,232 @@
+# === partition_store.py ===
+# Precomputed KPIs partitioned by cluster and month, loaded lazily per query:
+#   <root>/manifest.json
+#   <root>/cluster=<slug>/month=<YYYY-MM>-<run>.arrow
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+from agents.data_loader import compact_kpi_frame, load_kpi_data, write_arrow
+from agents.kpi_index import KPIIndex, frame_fingerprint
+from agents.store_resolver import StoreResolver
+
+KPI_PARTITION_DIR = os.getenv("KPI_PARTITION_DIR")
+# Upper bound on the memory held by loaded partitions, per process
+PARTITION_CACHE_MB = int(os.getenv("KPI_PARTITION_CACHE_MB", "512"))
+MANIFEST_FILE = "manifest.json"
+
+
+def cluster_slug(name: str) -> str:
+    """'Gurugram Cluster' → 'gurugram'."""
+    name = re.sub(r"\bcluster\b", "", name, flags=re.IGNORECASE)
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "default"
+
+
+def manifest_path(root: str) -> str:
+    return os.path.join(root, MANIFEST_FILE)
+
+
+def read_manifest(root: str) -> dict:
+    path = manifest_path(root)
+    if not os.path.exists(path):
+        return {"clusters": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(root: str, manifest: dict):
+    path = manifest_path(root)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def write_cluster_partitions(df: pd.DataFrame, root: str, cluster: str, source: str = None) -> dict:
+    """
+    Replace one cluster's precomputed data with one Arrow file per month.
+
+    New files get a run-specific name and the manifest is swapped last, so a
+    reader on the previous manifest keeps working; files referenced by neither
+    the new nor the previous manifest are deleted afterwards.
+    """
+    slug = cluster_slug(cluster)
+    cluster_dir = os.path.join(root, f"cluster={slug}")
+    os.makedirs(cluster_dir, exist_ok=True)
+    run = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+
+    df = df.copy()
+    df["Date"] = pd.to_datetime(df["Date"])
+    partitions = {}
+    for month, month_df in df.groupby(df["Date"].dt.strftime("%Y-%m"), sort=True):
+        rel = os.path.join(f"cluster={slug}", f"month={month}-{run}.arrow")
+        # Written compact so a partition loads as zero-copy views without re-sorting
+        write_arrow(compact_kpi_frame(month_df), os.path.join(root, rel))
+        partitions[month] = {
+            "file": rel,
+            "rows": len(month_df),
+            "min_date": month_df["Date"].min().date().isoformat(),
+            "max_date": month_df["Date"].max().date().isoformat(),
+            "fingerprint": frame_fingerprint(month_df),
+        }
+
+    manifest = read_manifest(root)
+    previous = manifest["clusters"].get(slug, {})
+    manifest["clusters"][slug] = {
+        "name": cluster,
+        "source": source,
+        "stores": sorted(df["Store Name"].dropna().astype(str).str.strip().str.upper().unique().tolist()),
+        "kpis": sorted(df["KPI Name"].dropna().astype(str).str.strip().str.upper().unique().tolist()),
+        "columns": [str(c) for c in df.columns],
+        "partitions": partitions,
+        "written_at": run,
+    }
+    _write_manifest(root, manifest)
+
+    keep = {p["file"] for p in partitions.values()} | {p["file"] for p in previous.get("partitions", {}).values()}
+    for f in os.listdir(cluster_dir):
+        rel = os.path.join(f"cluster={slug}", f)
+        if f.endswith(".arrow") and rel not in keep:
+            os.remove(os.path.join(root, rel))
+    return manifest["clusters"][slug]
+
+
+class PartitionCache:
+    """
+    LRU of loaded partitions (KPIIndex per file), bounded by their in-memory size.
+
+    Keys include the file's mtime and size, so a rewritten file is never served
+    from a stale entry. Concurrent requests for the same partition load it once.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key → (index, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str) -> KPIIndex:
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+            index = KPIIndex(load_kpi_data(path, compact=True))
+            nbytes = int(index._frame.memory_usage(deep=True).sum())
+            with self._lock:
+                self._entries[key] = (index, nbytes)
+                self._bytes += nbytes
+                # Always keep the newest entry, even if it alone exceeds the budget
+                while self._bytes > self.max_bytes and len(self._entries) > 1:
+                    _, (_, dropped) = self._entries.popitem(last=False)
+                    self._bytes -= dropped
+                self._loading.pop(key, None)
+        return index
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"partitions": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+# Shared by every store version, so unchanged partitions survive a reload
+partition_cache = PartitionCache(PARTITION_CACHE_MB * 2**20)
+
+
+class PartitionedKPIStore:
+    """
+    KPIIndex-compatible view over every cluster's partitions.
+
+    Only the manifest is read up front (stores, KPIs, months per cluster). A
+    query is routed to the clusters owning its stores and the months covering
+    its dates; those partitions are loaded on demand through `partition_cache`.
+    """
+
+    def __init__(self, root: str, cache: PartitionCache = None):
+        self.root = root
+        self.cache = cache or partition_cache
+        self.manifest = read_manifest(root)
+        self.version = hashlib.sha256(json.dumps(
+            {slug: {m: p["fingerprint"] for m, p in c["partitions"].items()}
+             for slug, c in self.manifest["clusters"].items()}, sort_keys=True,
+        ).encode("utf-8")).hexdigest()
+
+        self._store_cluster = {}
+        for slug, cluster in self.manifest["clusters"].items():
+            for store in cluster["stores"]:
+                self._store_cluster.setdefault(store, slug)
+        self.stores = sorted(self._store_cluster)
+        self.kpis = sorted({k for c in self.manifest["clusters"].values() for k in c["kpis"]})
+        self._rows = sum(p["rows"] for c in self.manifest["clusters"].values() for p in c["partitions"].values())
+        self.resolver = StoreResolver(self.stores)
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def columns(self):
+        clusters = list(self.manifest["clusters"].values())
+        return pd.Index(clusters[0]["columns"] if clusters else [])
+
+    def match_stores(self, store_names, threshold=None):
+        return self.resolver.match(store_names, threshold)
+
+    def partitions_for(self, stores=None, start=None, end=None, dates=None) -> list:
+        """Partition files a query touches, in (cluster, month) order."""
+        if stores is None:
+            clusters = list(self.manifest["clusters"])
+        else:
+            clusters = sorted({self._store_cluster[s] for s in stores if s in self._store_cluster})
+
+        months = None
+        if dates is not None:
+            months = {pd.Timestamp(d).strftime("%Y-%m") for d in dates}
+        elif start is not None or end is not None:
+            lo = pd.Timestamp(start) if start is not None else None
+            hi = pd.Timestamp(end) if end is not None else None
+
+        files = []
+        for slug in clusters:
+            for month, part in sorted(self.manifest["clusters"][slug]["partitions"].items()):
+                if months is not None and month not in months:
+                    continue
+                if dates is None and (start is not None or end is not None):
+                    if (lo is not None and part["max_date"] < lo.date().isoformat()) or \
+                       (hi is not None and part["min_date"] > hi.date().isoformat()):
+                        continue
+                files.append(os.path.join(self.root, part["file"]))
+        return files
+
+    def select(self, stores=None, kpis=None, start=None, end=None, dates=None) -> pd.DataFrame:
+        """Same contract as KPIIndex.select, reading only the partitions the query touches."""
+        results = [
+            self.cache.get(path).select(stores=stores, kpis=kpis, start=start, end=end, dates=dates)
+            for path in self.partitions_for(stores, start, end, dates)
+        ]
+        results = [r for r in results if len(r)]
+        if not results:
+            return pd.DataFrame(columns=self.columns)
+        if len(results) == 1:
+            return results[0]
+        return pd.concat(results, ignore_index=True).sort_values(by=["Store Name", "Date"], kind="stable")
@@ -1,5 +1,29 @@
-import pandas as pd
+import argparse
 import os
+from datetime import datetime
+
+import pandas as pd
+
+from agents.data_loader import (
+    appended_parts_dir,
+    list_appended_parts,
+    load_columnar,
+    load_kpi_data,
+    write_arrow,
+)
+from agents.partition_store import write_cluster_partitions
+
+RAW_COLUMNS = ['Store Name', 'KPI Name', 'Date', 'Plan', 'Actual']
+
+# === Rolling / anomaly features ===
+ROLLING_WINDOW = 7
+ROLLING_MIN_PERIODS = 3
+ANOMALY_Z = 2.0
+# KPIs whose MTD Actual is a month-to-date average (a ratio or percentage)
+# rather than a running total; their day value is recovered from the average.
+# Every other KPI is additive and tracked on its Daily Actual.
+RATIO_KPIS = {'AVERAGE BILL VALUE', 'AVAILABILITY', 'BASKET BUILDER AVAILABILITY', 'JIOMART SLA ADHERENCE'}
+FEATURE_COLUMNS = ['KPI Value', 'Rolling 7D Mean', 'DoD Delta', 'Z-Score', 'Anomaly Flag']
 
 def precompute_advanced_kpi_metrics(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
@@ -7,27 +31,176 @@ def precompute_advanced_kpi_metrics(df: pd.DataFrame) -> pd.DataFrame:
     df = df.sort_values(by=['Store Name', 'KPI Name', 'Date'])
 
     # === ✅ Only Step 1: Daily Plan, Actual, and Achievement % ===
-    for kpi in df['KPI Name'].unique():
-        kpi_df = df[df['KPI Name'] == kpi].copy()
-        kpi_df['Daily Plan'] = kpi_df.groupby(['Store Name', 'KPI Name'])['Plan'].diff().fillna(kpi_df['Plan'])
-        kpi_df['Daily Actual'] = kpi_df.groupby(['Store Name', 'KPI Name'])['Actual'].diff().fillna(kpi_df['Actual'])
-        kpi_df['Daily Achievement %'] = (kpi_df['Daily Actual'] / kpi_df['Daily Plan']) * 100
-        kpi_df['Daily Achievement %'] = kpi_df['Daily Achievement %'].round(2)
-        df.loc[kpi_df.index, ['Daily Plan', 'Daily Actual', 'Daily Achievement %']] = kpi_df[
-            ['Daily Plan', 'Daily Actual', 'Daily Achievement %']
-        ]
+    # One grouped pass over all KPIs; rows are already sorted so diff() sees
+    # each (store, KPI) series in date order. Plan/Actual are month-to-date and
+    # reset on the 1st, so the first day of a month is its own daily value.
+    grouped = df.groupby(['Store Name', 'KPI Name', df['Date'].dt.to_period('M')], sort=False)
+    daily_plan = grouped['Plan'].diff().fillna(df['Plan'])
+    daily_actual = grouped['Actual'].diff().fillna(df['Actual'])
+    daily_achievement = ((daily_actual / daily_plan) * 100).round(2)
+
+    # Rows without a KPI Name never matched a KPI in the old per-KPI loop
+    no_kpi = df['KPI Name'].isna()
+    df['Daily Plan'] = daily_plan.mask(no_kpi).astype(float)
+    df['Daily Actual'] = daily_actual.mask(no_kpi).astype(float)
+    df['Daily Achievement %'] = daily_achievement.mask(no_kpi).astype(float)
+
+    # === ✅ Step 2: trailing 7-day mean, day-over-day delta and z-score anomalies ===
+    # Baseline is the ROLLING_WINDOW days *before* each date within the same
+    # month, so a drop is measured against the prior week rather than diluting itself.
+    df = add_rolling_features(df)
 
     return df
 
-# === Run it ===
-if __name__ == "__main__":
-    input_file = "data/Gurugram Cluster.xlsx"
-    output_file = "data/kpi_precomputed.xlsx"
+def add_rolling_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized per-(store, KPI, month) rolling features; expects rows sorted by store, KPI, date.
 
-    if not os.path.exists(input_file):
-        print(f"❌ Input file not found: {input_file}")
-        exit()
+    Features are computed on each KPI's day value, never on the running MTD
+    total: Daily Actual for additive KPIs, and for RATIO_KPIS the value implied
+    by consecutive month-to-date averages (day × average is the month's running
+    sum). Plan/Actual reset on the 1st, so every window restarts with the
+    month: the first days of a month get no baseline instead of one computed
+    across the reset.
+    """
+    keys = [df['Store Name'], df['KPI Name'], df['Date'].dt.to_period('M')]
+    day = df['Date'].dt.day.astype(float)
+    running_sum = df['Actual'] * day
+    days_elapsed = day.groupby(keys, sort=False).diff().fillna(day)
+    ratio_value = running_sum.groupby(keys, sort=False).diff().fillna(running_sum) / days_elapsed
+    value = df['Daily Actual'].where(~df['KPI Name'].isin(RATIO_KPIS), ratio_value).astype(float)
+    df['KPI Value'] = value
+
+    grouped = value.groupby(keys, sort=False)
+    prior = grouped.shift(1)
+    prior_grouped = prior.groupby(keys, sort=False)
+    rolling = prior_grouped.rolling(ROLLING_WINDOW, min_periods=ROLLING_MIN_PERIODS)
+    mean = rolling.mean().reset_index(level=[0, 1, 2], drop=True)
+    std = rolling.std().reset_index(level=[0, 1, 2], drop=True)
+
+    z = (value - mean) / std.where(std > 0)
+    df['Rolling 7D Mean'] = mean.round(2)
+    df['DoD Delta'] = grouped.diff().round(2)
+    df['Z-Score'] = z.round(2)
+    df['Anomaly Flag'] = (z >= ANOMALY_Z).astype(int) - (z <= -ANOMALY_Z).astype(int)
+    return df
+
+# === Incremental mode: checkpoint of the last cumulative Plan/Actual ===
+# The diff needs the previous row and the rolling features the previous
+# ROLLING_WINDOW daily values, so ROLLING_WINDOW + 1 raw rows are kept per series.
+CHECKPOINT_HISTORY = ROLLING_WINDOW + 1
+
+def checkpoint_path(output_file: str) -> str:
+    return os.path.splitext(output_file)[0] + "_checkpoint.arrow"
+
+
+def _trim_checkpoint(cp: pd.DataFrame) -> pd.DataFrame:
+    cp = cp.sort_values(by=['Store Name', 'KPI Name', 'Date'])
+    recent = cp.groupby(['Store Name', 'KPI Name'], sort=False).cumcount(ascending=False) < CHECKPOINT_HISTORY
+    month_last = cp.groupby(['Store Name', 'KPI Name', 'Month'], sort=False).cumcount(ascending=False) == 0
+    return cp[recent | month_last].reset_index(drop=True)
+
+
+def build_checkpoint(df: pd.DataFrame) -> pd.DataFrame:
+    """Last cumulative Plan/Actual row per (store, KPI, month) plus the recent rows rolling features need."""
+    cp = df[RAW_COLUMNS].dropna(subset=['Store Name', 'KPI Name']).copy()
+    cp['Date'] = pd.to_datetime(cp['Date'])
+    cp['Month'] = cp['Date'].dt.to_period('M').astype(str)
+    return _trim_checkpoint(cp)
+
+
+def merge_checkpoint(old: pd.DataFrame, new_rows: pd.DataFrame) -> pd.DataFrame:
+    return _trim_checkpoint(pd.concat([old, build_checkpoint(new_rows)], ignore_index=True))
+
+
+def _latest_per_series(checkpoint: pd.DataFrame, n: int = 1) -> pd.DataFrame:
+    latest = checkpoint.sort_values(by=['Store Name', 'KPI Name', 'Date'])
+    return latest.groupby(['Store Name', 'KPI Name'], sort=False).tail(n)
+
+
+def iter_raw_chunks(path: str, chunksize: int = 50_000):
+    """Stream a raw KPI sheet (XLSX or CSV) as DataFrame chunks instead of loading it whole."""
+    if path.lower().endswith(".csv"):
+        yield from pd.read_csv(path, chunksize=chunksize)
+        return
+
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else h for h in next(rows)]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        wb.close()
 
+
+def select_new_rows(chunks, checkpoint: pd.DataFrame) -> pd.DataFrame:
+    """Keep only rows dated after the last checkpointed date of their (store, KPI)."""
+    last_dates = _latest_per_series(checkpoint).set_index(['Store Name', 'KPI Name'])['Date']
+    new_parts = []
+    for chunk in chunks:
+        chunk = chunk[RAW_COLUMNS].copy()
+        chunk['Date'] = pd.to_datetime(chunk['Date'])
+        keys = pd.MultiIndex.from_frame(chunk[['Store Name', 'KPI Name']])
+        cutoff = pd.Series(last_dates.reindex(keys).to_numpy(), index=chunk.index)
+        new_parts.append(chunk[cutoff.isna() | (chunk['Date'] > cutoff)])
+    if not new_parts:
+        return pd.DataFrame(columns=RAW_COLUMNS)
+    return pd.concat(new_parts, ignore_index=True)
+
+
+def precompute_incremental(new_rows: pd.DataFrame, checkpoint: pd.DataFrame) -> pd.DataFrame:
+    """
+    Derive Daily and rolling columns for newly arrived rows only.
+
+    Each (store, KPI) is seeded with its last checkpointed rows, so the grouped
+    diff and rolling windows continue exactly where the last run stopped.
+    """
+    seeds = _latest_per_series(checkpoint, CHECKPOINT_HISTORY)
+    seeds = seeds[seeds.set_index(['Store Name', 'KPI Name']).index.isin(
+        pd.MultiIndex.from_frame(new_rows[['Store Name', 'KPI Name']])
+    )][RAW_COLUMNS]
+
+    combined = pd.concat([seeds.assign(_seed=True), new_rows.assign(_seed=False)], ignore_index=True)
+    computed = precompute_advanced_kpi_metrics(combined)
+    return computed[~computed['_seed'].astype(bool)].drop(columns='_seed')
+
+
+def run_incremental(input_file: str, output_file: str, chunksize: int = 50_000) -> int:
+    cp_file = checkpoint_path(output_file)
+    if os.path.exists(cp_file):
+        checkpoint = load_columnar(cp_file)
+    else:
+        print("🧭 No checkpoint yet — seeding it from the existing precomputed data...")
+        checkpoint = build_checkpoint(load_kpi_data(output_file))
+
+    print(f"🔄 Streaming {input_file} in chunks of {chunksize:,} rows...")
+    new_rows = select_new_rows(iter_raw_chunks(input_file, chunksize), checkpoint)
+    if new_rows.empty:
+        print("✅ No new rows since last run.")
+        return 0
+
+    computed = precompute_incremental(new_rows, checkpoint)
+
+    parts_dir = appended_parts_dir(output_file)
+    os.makedirs(parts_dir, exist_ok=True)
+    part_file = os.path.join(parts_dir, f"part-{datetime.now():%Y%m%dT%H%M%S%f}.arrow")
+    write_arrow(computed, part_file)
+    # Part before checkpoint: a crash in between re-appends these rows next run instead of losing them
+    write_arrow(merge_checkpoint(checkpoint, new_rows), cp_file)
+
+    print(f"💾 Appended {len(computed):,} rows to {part_file}")
+    return len(computed)
+
+
+def run_full(input_file: str, output_file: str):
     print("🔄 Reading raw KPI file...")
     raw_df = pd.read_excel(input_file)
 
@@ -37,5 +210,51 @@ if __name__ == "__main__":
     print(f"💾 Saving precomputed data to {output_file}...")
     computed_df.to_excel(output_file, index=False)
 
+    # Full rebuild supersedes any appended parts
+    for part in list_appended_parts(output_file):
+        os.remove(part)
+    write_arrow(build_checkpoint(computed_df), checkpoint_path(output_file))
+
     print("✅ Done! Preview:")
     print(computed_df.head(3))
+
+
+def run_partitioned(input_file: str, partition_dir: str, cluster: str = None):
+    """Full rebuild of one cluster's month partitions under partition_dir (other clusters are kept)."""
+    cluster = cluster or os.path.splitext(os.path.basename(input_file))[0]
+    print(f"🔄 Reading raw KPI file for cluster '{cluster}'...")
+    raw_df = pd.concat(iter_raw_chunks(input_file), ignore_index=True)
+
+    print("🧠 Precomputing KPI metrics (only till Daily Achievement %)...")
+    computed_df = precompute_advanced_kpi_metrics(raw_df)
+
+    entry = write_cluster_partitions(computed_df, partition_dir, cluster, source=input_file)
+    print(f"💾 Wrote {len(entry['partitions'])} month partitions "
+          f"({len(computed_df):,} rows, {len(entry['stores'])} stores) to {partition_dir}")
+
+
+# === Run it ===
+# python -m agents.precomputed_agent               → full rebuild
+# python -m agents.precomputed_agent --incremental → append only new daily rows
+# python -m agents.precomputed_agent --input "data/Noida Cluster.xlsx" --partition-dir data/kpi_partitions
+#                                                  → rebuild one cluster's month partitions
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute daily KPI metrics")
+    parser.add_argument("--input", default="data/Gurugram Cluster.xlsx")
+    parser.add_argument("--output", default="data/kpi_precomputed.xlsx")
+    parser.add_argument("--incremental", action="store_true", help="process only rows newer than the checkpoint")
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    parser.add_argument("--partition-dir", help="write per-cluster, per-month partitions here instead of --output")
+    parser.add_argument("--cluster", help="cluster name for --partition-dir (default: input file name)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"❌ Input file not found: {args.input}")
+        exit()
+
+    if args.partition_dir:
+        run_partitioned(args.input, args.partition_dir, args.cluster)
+    elif args.incremental and (os.path.exists(args.output) or os.path.exists(checkpoint_path(args.output))):
+        run_incremental(args.input, args.output, args.chunksize)
+    else:
+        run_full(args.input, args.output)
@@ -1,16 +1,19 @@
 # === query_classifier_node.py ===
-import os
 import re
 import json
 from dotenv import load_dotenv
-from openai import OpenAI
-from langsmith.wrappers import wrap_openai
 from langchain_core.runnables import RunnableLambda
 from schemas import KPIQuery
+from agents.llm_cache import TieredCache, make_cache_key
+from agents.rule_classifier import RULE_CONFIDENCE_THRESHOLD, rule_classify
+from agents.llm_backends import StubBackend, get_backend
+from agents.instrumentation import annotate, debug_print, instrument_node
 
-# === Load .env and wrap OpenAI client for LangSmith tracing ===
+# === Load .env (backend selection, API keys) ===
 load_dotenv()
-client = wrap_openai(OpenAI(api_key=os.getenv("OPENAI_API_KEY")))
+
+# Default remote model; CLASSIFIER_BACKEND=llama_cpp|stub switches to a local or offline backend
+CLASSIFIER_MODEL = "gpt-4.1-nano"
 
 # === Mapping KPI → signals ===
 SIGNAL_MAPPING = {
@@ -20,8 +23,43 @@ SIGNAL_MAPPING = {
     "NOB": ["NUMBER OF BILLS", "AVERAGE BILL VALUE"]
 }
 
-def build_prompt(query: str) -> str:
-    today = "2025-02-28"
+# === Reference "today" the classifier resolves relative dates against ===
+REFERENCE_TODAY = "2025-02-28"
+
+RETRIEVAL_STRATEGIES = ["single_date_analysis", "compare_dates", "trend_analysis", "full_range", "causal_analysis"]
+
+def classification_schema() -> dict:
+    """KPIQuery's JSON schema minus the fields filled in after the model call; local backends decode against it."""
+    schema = getattr(KPIQuery, "model_json_schema", KPIQuery.schema)()
+    properties = {k: v for k, v in schema["properties"].items() if k not in ("user_query", "required_signals")}
+    properties["retrieval_strategy"] = {"type": "string", "enum": RETRIEVAL_STRATEGIES}
+    properties["mtd_mode"] = {"type": "string", "enum": ["yes", "no"]}
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+CLASSIFICATION_SCHEMA = classification_schema()
+
+# Reply of the offline stub backend: a fixed, schema-valid classification
+STUB_CLASSIFICATION = {
+    "mentioned_kpis": ["NET SALES"],
+    "start_date": "2025-02-22",
+    "end_date": REFERENCE_TODAY,
+    "days_back": 7,
+    "important_dates": [],
+    "retrieval_strategy": "trend_analysis",
+    "store_names": [],
+    "mtd_mode": "no",
+}
+
+def get_classifier_backend():
+    return get_backend("classifier", CLASSIFIER_MODEL, lambda: StubBackend(default=json.dumps(STUB_CLASSIFICATION)))
+
+# === Classification cache (normalized query + reference date + backend → LLM JSON) ===
+classification_cache = TieredCache("query_classification", max_memory_items=512, ttl_seconds=24 * 3600)
+
+def normalize_query_text(query: str) -> str:
+    return " ".join(query.lower().split()).rstrip("?.! ")
+
+def build_prompt(query: str, today: str = REFERENCE_TODAY) -> str:
     return f'''
 You are a query classification assistant for a retail KPI chatbot.
 
@@ -54,23 +92,46 @@ def extract_json(text: str) -> str:
     match = re.search(r"\{.*\}", text, re.DOTALL)
     return match.group(0) if match else None
 
-def classify_query_node(state: dict) -> dict:
+def _fast_classification(state: dict):
+    """
+    Try the rule parser, then the cache. Returns (result, path, confidence, cache_key);
+    result is None when the LLM has to be asked.
+    """
     user_query = state["user_query"]
-    prompt = build_prompt(user_query)
+    index = state.get("kpi_index")
+    store_resolver = index.resolver if index is not None else None
+
+    # ✅ Fast path: deterministic rules, no network round trip
+    rule_result, confidence = rule_classify(user_query, store_resolver, REFERENCE_TODAY)
+    use_rules = rule_result is not None and confidence >= RULE_CONFIDENCE_THRESHOLD
+    cache_key = make_cache_key(normalize_query_text(user_query), REFERENCE_TODAY, get_classifier_backend().name)
+    if use_rules:
+        return rule_result, "rules", confidence, cache_key
+
+    cached = classification_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached), "cache", confidence, cache_key
+    return None, "llm", confidence, cache_key
+
+def _llm_request(user_query: str) -> dict:
+    return {
+        "messages": [{"role": "user", "content": build_prompt(user_query, REFERENCE_TODAY)}],
+        "temperature": 0,
+        "max_tokens": 512,
+        "json_schema": CLASSIFICATION_SCHEMA,
+    }
 
-    response = client.chat.completions.create(
-        model="gpt-4.1-nano",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0,
-        max_tokens=512
-    )
+def _record_reply(backend, reply):
+    annotate(backend=backend.name, prompt_tokens=reply.prompt_tokens, completion_tokens=reply.completion_tokens)
 
-    text_response = response.choices[0].message.content
+def _parse_llm_output(text_response: str) -> dict:
     json_text = extract_json(text_response)
     if not json_text:
         raise ValueError("❌ No JSON found in response.")
+    return json.loads(json_text)
 
-    result = json.loads(json_text)
+def _finalize_classification(state: dict, result: dict, path: str, confidence: float, cache_key: str) -> dict:
+    user_query = state["user_query"]
 
     # Add user query to result
     result["user_query"] = user_query
@@ -84,20 +145,49 @@ def classify_query_node(state: dict) -> dict:
         result["required_signals"] = list(signals)
 
     # Debugging output
-    print("\n📌 [CLASSIFIER DEBUG]")
-    print("User Query:", user_query)
-    print("Mentioned KPIs:", result["mentioned_kpis"])
-    print("Start Date:", result["start_date"])
-    print("End Date:", result["end_date"])
-    print("Days Back:", result["days_back"])
-    print("Store Names:", result["store_names"])
-    print("Strategy:", result["retrieval_strategy"])
-    print("Required Signals:", result["required_signals"])
+    debug_print("\n📌 [CLASSIFIER DEBUG]")
+    debug_print("User Query:", user_query)
+    debug_print("Mentioned KPIs:", result["mentioned_kpis"])
+    debug_print("Start Date:", result["start_date"])
+    debug_print("End Date:", result["end_date"])
+    debug_print("Days Back:", result["days_back"])
+    debug_print("Store Names:", result["store_names"])
+    debug_print("Strategy:", result["retrieval_strategy"])
+    debug_print("Required Signals:", result["required_signals"])
+    debug_print(f"Path: {path} (rule confidence={confidence})", classification_cache.stats())
 
     validated = KPIQuery(**result).dict()
+    annotate(path=path, cache={"cache": "hit", "llm": "miss"}.get(path))
+
+    # Only cache classifications that validate; user_query is re-attached per request
+    if path == "llm":
+        classification_cache.set(cache_key, {k: v for k, v in result.items() if k != "user_query"})
+
     return {
         **state,
-        "structured": result
+        "structured": result,
+        "classification_path": path
     }
 
-query_classifier_node = RunnableLambda(classify_query_node)
\ No newline at end of file
+def classify_query_node(state: dict) -> dict:
+    result, path, confidence, cache_key = _fast_classification(state)
+    if result is None:
+        backend = get_classifier_backend()
+        reply = backend.complete(**_llm_request(state["user_query"]))
+        _record_reply(backend, reply)
+        result = _parse_llm_output(reply.text)
+    return _finalize_classification(state, result, path, confidence, cache_key)
+
+async def aclassify_query_node(state: dict) -> dict:
+    result, path, confidence, cache_key = _fast_classification(state)
+    if result is None:
+        backend = get_classifier_backend()
+        reply = await backend.acomplete(**_llm_request(state["user_query"]))
+        _record_reply(backend, reply)
+        result = _parse_llm_output(reply.text)
+    return _finalize_classification(state, result, path, confidence, cache_key)
+
+query_classifier_node = RunnableLambda(
+    instrument_node("query_classifier")(classify_query_node),
+    afunc=instrument_node("query_classifier")(aclassify_query_node)
+)
\ No newline at end of file
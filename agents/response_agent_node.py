@@ -8,13 +8,41 @@ import pandas as pd
 from openai import OpenAI
 from langsmith.wrappers import wrap_openai
 from langchain.callbacks import tracing_v2_enabled
+import asyncio
+import contextvars
 import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from agents.kpi_index import frame_fingerprint
+from agents.context_builder import build_compact_context
+from agents.direct_answer import direct_answer
+from agents.llm_cache import TieredCache, make_cache_key
+from agents.llm_clients import get_async_client, llm_slot
+from agents.instrumentation import NodeSpan, active_span, annotate, debug_print, instrument_node, record_usage
 
 load_dotenv()
 
 client = wrap_openai(OpenAI(api_key=os.getenv("OPENAI_API_KEY")))
 
+RESPONSE_MODEL = "gpt-4.1-mini"
+RESPONSE_ERROR_PREFIX = "⚠️ Error generating response"
+
+# === Response cache (structured query + context fingerprint + dataset version → answer) ===
+response_cache = TieredCache("kpi_responses", max_memory_items=256, ttl_seconds=12 * 3600)
+
+# The question's own wording is left out of the key so paraphrases that render the same prompt share an answer
+USER_QUESTION_RE = re.compile(r'The user asked: ".*?"\n', re.DOTALL)
+
+def response_cache_key(structured_query: dict, df: pd.DataFrame, messages: list, dataset_version: str = None) -> str:
+    structured_key = {k: v for k, v in structured_query.items() if k != "user_query"}
+    prompt = [
+        USER_QUESTION_RE.sub("", m["content"], count=1) if m["role"] == "user" else m["content"]
+        for m in messages
+    ]
+    return make_cache_key(RESPONSE_MODEL, structured_key, frame_fingerprint(df), dataset_version, prompt)
+
 # === 🧠 State Type ===
 class ResponseState(TypedDict):
     user_query: str
@@ -23,7 +51,7 @@ class ResponseState(TypedDict):
     final_response: Annotated[str, "final chatbot response"]
 
 # === 🔧 Prompt Builder ===
-def build_chat_prompt(user_query: str, structured_query: dict, df: pd.DataFrame) -> list:
+def build_chat_prompt(user_query: str, structured_query: dict, df: pd.DataFrame, causal_facts: list = None) -> list:
     mentioned_kpis = structured_query.get("mentioned_kpis") or []
     if not isinstance(mentioned_kpis, list):
         mentioned_kpis = [mentioned_kpis]
@@ -31,8 +59,10 @@ def build_chat_prompt(user_query: str, structured_query: dict, df: pd.DataFrame)
     strategy = structured_query.get("strategy", "")
     dates = ", ".join(structured_query.get("important_dates", [])) or f"{structured_query.get('start_date', '')} to {structured_query.get('end_date', '')}"
 
-    df_cleaned = df.copy()
-    table_str = df_cleaned.head(20).to_markdown(index=False)
+    table_str = build_compact_context(df, structured_query)
+    facts_str = ""
+    if causal_facts:
+        facts_str = "Precomputed facts (vs the 7 days before each date):\n" + "\n".join(f"- {f}" for f in causal_facts) + "\n"
 
     system_msg = {
         "role": "system",
@@ -87,7 +117,7 @@ You are a retail KPI analytics expert.
 🧠 ROOT CAUSE ANALYSIS:
 - Use Daily Achievement % to identify weak performance.
 - Then evaluate supporting KPIs (ABV, NOB, Availability) for cause.
-- Check 7-day average of those KPIs before the date and compare.
+- Check 7-day average of those KPIs before the date and compare. When "Precomputed facts" are given, use their 7-day averages, z-scores and anomaly flags as-is instead of recomputing them.
 - Use cautious reasoning: “data suggests”, “possibly due to”, “drop from trend”, etc.
 
 🚫 FINAL RESTRICTIONS:
@@ -112,10 +142,11 @@ KPI(s): {kpis}
 Strategy: {strategy}
 Relevant Dates: {dates}
 
-Here is the relevant data (first 20 rows only):
+Here is the relevant data, one table per store (rows = dates, columns = KPI metrics; a first row with a date range summarizes older days):
 
 {table_str}
 
+{facts_str}
 Please analyze carefully and give full reasoning using trends across all days. Avoid speculation outside the data.
 """
     }
@@ -123,33 +154,330 @@ Please analyze carefully and give full reasoning using trends across all days. A
     return [system_msg, user_msg]
 
 # === ✅ LangGraph Node ===
-def response_agent_node(state: ResponseState) -> ResponseState:
-    print("\n🧠 [DEBUG] Keys in response agent state:")
-    print(list(state.keys()))
+def _prepare_response(state: dict):
+    """
+    Build the prompt and look up the cache. Returns (answer, messages, cache_key);
+    answer is set when no LLM call is needed (empty context or cache hit).
+    """
     user_query = state["user_query"]
     structured = state["structured"]
     df = state["context_df"]
 
+    annotate(rows_in=len(df))
     if df.empty:
-        return {**state, "final_response": "❌ No data available to answer this query."}
+        return "❌ No data available to answer this query.", None, None
+
+    index = state.get("kpi_index")
+    dataset_version = index.version if index is not None else None
+
+    messages = build_chat_prompt(user_query, structured, df, state.get("causal_facts"))
+    cache_key = response_cache_key(structured, df, messages, dataset_version)
+    cached = response_cache.get(cache_key)
+    annotate(cache="hit" if cached is not None else "miss")
+    if cached is not None:
+        debug_print("♻️ [RESPONSE CACHE] hit", response_cache.stats())
+    return cached, messages, cache_key
+
+def _direct_answer(state: dict):
+    """Computed answer for plain value lookups; the LLM is skipped when this is not None."""
+    answer = direct_answer(state)
+    if answer is not None:
+        annotate(rows_in=len(state["context_df"]), answer_path="direct")
+    return answer
+
+def _llm_request(messages: list, **kwargs) -> dict:
+    return {"model": RESPONSE_MODEL, "messages": messages, "temperature": 0.2, "max_tokens": 1500, **kwargs}
+
+# === 🔀 Per-store fan-out ===
+# RESPONSE_FANOUT=1: multi-store context is answered with one concurrent generation per store
+RESPONSE_FANOUT = os.getenv("RESPONSE_FANOUT", "0").lower() in ("1", "true", "yes")
+FANOUT_MIN_STORES = int(os.getenv("RESPONSE_FANOUT_MIN_STORES", "2"))
+FANOUT_MAX_WORKERS = int(os.getenv("RESPONSE_FANOUT_MAX_WORKERS", "8"))
+# RESPONSE_FANOUT_SUMMARY=1 adds a cross-store summary: one more, serial LLM call after the slowest store
+FANOUT_SUMMARY = os.getenv("RESPONSE_FANOUT_SUMMARY", "0").lower() in ("1", "true", "yes")
+SUMMARY_MAX_TOKENS = 300
+
+_fanout_pool = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix="response-fanout")
+
+def should_fan_out(state: dict) -> bool:
+    """Fan out when enabled (globally or per request via state["fanout"]) and the context spans enough stores."""
+    df = state.get("context_df")
+    if not state.get("fanout", RESPONSE_FANOUT) or df is None or df.empty:
+        return False
+    return df["Store Name"].nunique() >= FANOUT_MIN_STORES
+
+def store_facts(facts: list, store: str) -> list:
+    """The causal facts about one store (each fact starts with "<store> · ")."""
+    return [f for f in facts or [] if f.startswith(f"{store} · ")]
+
+def split_by_store(state: dict) -> list:
+    """(store, sub-state) per store: its rows, the structured query narrowed to it, and its causal facts."""
+    facts = state.get("causal_facts") or []
+    subs = []
+    for store, store_df in state["context_df"].groupby("Store Name", sort=True, observed=True):
+        store = str(store)
+        subs.append((store, {
+            **state,
+            "structured": {**state["structured"], "store_names": [store]},
+            "context_df": store_df,
+            "causal_facts": store_facts(facts, store),
+        }))
+    return subs
+
+def build_summary_prompt(user_query: str, sections: list) -> list:
+    analyses = "\n\n".join(f"### {store}\n{answer}" for store, answer in sections)
+    return [
+        {"role": "system", "content": (
+            "You are a retail KPI analytics expert. You are given separate analyses of several stores for the same question. "
+            "Write a short cross-store summary (3-5 bullets): strongest and weakest stores, patterns they share and "
+            "store-specific outliers. Use only facts stated in the analyses and always name the stores."
+        )},
+        {"role": "user", "content": f"The user asked: \"{user_query}\"\n\n{analyses}"},
+    ]
+
+def assemble_fanout_answer(sections: list, summary: str = None) -> str:
+    """Store sections in store order, then the summary: the same layout the streaming path produces."""
+    parts = [f"### {store}\n{answer}" for store, answer in sections]
+    if summary:
+        parts.append(f"### Cross-store summary\n{summary}")
+    return "\n\n".join(parts)
+
+def _usage(response) -> tuple:
+    usage = getattr(response, "usage", None)
+    return (usage.prompt_tokens, usage.completion_tokens) if usage is not None else (0, 0)
+
+def _generate_store(sub_state: dict) -> tuple:
+    """(answer, cached, prompt_tokens, completion_tokens) for one store; errors become that store's answer."""
+    answer, messages, cache_key = _prepare_response(sub_state)
+    if answer is not None:
+        return answer, True, 0, 0
+    try:
+        response = client.chat.completions.create(**_llm_request(messages))
+    except Exception as e:
+        return f"{RESPONSE_ERROR_PREFIX}: {str(e)}", False, 0, 0
+    answer = response.choices[0].message.content.strip()
+    response_cache.set(cache_key, answer)
+    return (answer, False, *_usage(response))
+
+async def _agenerate_store(sub_state: dict, gate: asyncio.Semaphore) -> tuple:
+    answer, messages, cache_key = _prepare_response(sub_state)
+    if answer is not None:
+        return answer, True, 0, 0
+    try:
+        async with gate, llm_slot():
+            response = await get_async_client().chat.completions.create(**_llm_request(messages))
+    except Exception as e:
+        return f"{RESPONSE_ERROR_PREFIX}: {str(e)}", False, 0, 0
+    answer = response.choices[0].message.content.strip()
+    response_cache.set(cache_key, answer)
+    return (answer, False, *_usage(response))
+
+def _submit_store_jobs(state: dict) -> dict:
+    """Start one generation per store on the shared pool; each job runs in a copy of the caller's context."""
+    return {
+        _fanout_pool.submit(contextvars.copy_context().run, _generate_store, sub_state): store
+        for store, sub_state in split_by_store(state)
+    }
+
+def _summary_request(state: dict, sections: list):
+    """(cache_key, request kwargs) for the cross-store summary, or (None, None) when it is skipped."""
+    usable = [(s, a) for s, a in sections if not a.startswith(RESPONSE_ERROR_PREFIX)]
+    if not FANOUT_SUMMARY or len(usable) < 2:
+        return None, None
+    messages = build_summary_prompt(state["user_query"], usable)
+    return make_cache_key(RESPONSE_MODEL, "fanout_summary", messages), _llm_request(messages, max_tokens=SUMMARY_MAX_TOKENS)
+
+def _summarize_stores(state: dict, sections: list) -> tuple:
+    """(summary or None, (prompt_tokens, completion_tokens)); a failed summary is dropped, not fatal."""
+    key, request = _summary_request(state, sections)
+    if request is None:
+        return None, (0, 0)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached, (0, 0)
+    try:
+        response = client.chat.completions.create(**request)
+    except Exception as e:
+        debug_print(f"⚠️ [FANOUT] summary skipped: {e}")
+        return None, (0, 0)
+    summary = response.choices[0].message.content.strip()
+    response_cache.set(key, summary)
+    return summary, _usage(response)
+
+async def _asummarize_stores(state: dict, sections: list) -> tuple:
+    key, request = _summary_request(state, sections)
+    if request is None:
+        return None, (0, 0)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached, (0, 0)
+    try:
+        async with llm_slot():
+            response = await get_async_client().chat.completions.create(**request)
+    except Exception as e:
+        debug_print(f"⚠️ [FANOUT] summary skipped: {e}")
+        return None, (0, 0)
+    summary = response.choices[0].message.content.strip()
+    response_cache.set(key, summary)
+    return summary, _usage(response)
+
+def _annotate_fanout(results: list, summary_usage=(0, 0)):
+    cached = sum(r[1] for r in results)
+    failed = [r[0] for r in results if r[0].startswith(RESPONSE_ERROR_PREFIX)]
+    annotate(
+        fanout_stores=len(results),
+        cache="hit" if cached == len(results) else ("partial" if cached else "miss"),
+        prompt_tokens=sum(r[2] for r in results) + summary_usage[0],
+        completion_tokens=sum(r[3] for r in results) + summary_usage[1],
+        error=failed[0] if failed else None,
+    )
+
+def fan_out_response(state: dict) -> str:
+    """One generation per store on a bounded thread pool, assembled with an optional cross-store summary."""
+    jobs = _submit_store_jobs(state)
+    by_store = {jobs[f]: f.result() for f in as_completed(jobs)}
+    results = [by_store[store] for store in sorted(by_store)]
+    sections = [(store, by_store[store][0]) for store in sorted(by_store)]
+
+    summary, summary_usage = _summarize_stores(state, sections)
+    annotate(rows_in=len(state["context_df"]))
+    _annotate_fanout(results, summary_usage)
+    return assemble_fanout_answer(sections, summary)
+
+async def afan_out_response(state: dict) -> str:
+    gate = asyncio.Semaphore(FANOUT_MAX_WORKERS)
+    subs = split_by_store(state)
+    results = await asyncio.gather(*(_agenerate_store(sub_state, gate) for _, sub_state in subs))
+    sections = [(store, r[0]) for (store, _), r in zip(subs, results)]
+
+    summary, summary_usage = await _asummarize_stores(state, sections)
+    annotate(rows_in=len(state["context_df"]))
+    _annotate_fanout(results, summary_usage)
+    return assemble_fanout_answer(sections, summary)
+
+def response_agent_node(state: ResponseState) -> ResponseState:
+    debug_print("\n🧠 [DEBUG] Keys in response agent state:")
+    debug_print(list(state.keys()))
 
     with tracing_v2_enabled():
-        messages = build_chat_prompt(user_query, structured, df)
+        answer = _direct_answer(state)
+        if answer is not None:
+            return {**state, "final_response": answer}
+        if should_fan_out(state):
+            return {**state, "final_response": fan_out_response(state)}
+        answer, messages, cache_key = _prepare_response(state)
+        if answer is not None:
+            return {**state, "final_response": answer}
+
         try:
-            response = client.chat.completions.create(
-                model="gpt-4.1-mini",
-                messages=messages,
-                temperature=0.2,
-                max_tokens=1500
-            )
+            response = client.chat.completions.create(**_llm_request(messages))
+            record_usage(response)
             answer = response.choices[0].message.content.strip()
+            response_cache.set(cache_key, answer)
             return {**state, "final_response": answer}
         except Exception as e:
-            return {**state, "final_response": f"⚠️ Error generating response: {str(e)}"}
+            annotate(error=str(e))
+            return {**state, "final_response": f"{RESPONSE_ERROR_PREFIX}: {str(e)}"}
+
+async def aresponse_agent_node(state: ResponseState) -> ResponseState:
+    answer = _direct_answer(state)
+    if answer is not None:
+        return {**state, "final_response": answer}
+    if should_fan_out(state):
+        return {**state, "final_response": await afan_out_response(state)}
+    answer, messages, cache_key = _prepare_response(state)
+    if answer is not None:
+        return {**state, "final_response": answer}
+
+    try:
+        async with llm_slot():
+            response = await get_async_client().chat.completions.create(**_llm_request(messages))
+        record_usage(response)
+        answer = response.choices[0].message.content.strip()
+        response_cache.set(cache_key, answer)
+        return {**state, "final_response": answer}
+    except Exception as e:
+        annotate(error=str(e))
+        return {**state, "final_response": f"{RESPONSE_ERROR_PREFIX}: {str(e)}"}
+
+# === 🔁 Streaming variant ===
+def stream_response_tokens(state: dict):
+    """
+    Yield the answer for `state` as text chunks while the model generates it.
+
+    Same prompt, cache and error handling as response_agent_node; a cache hit
+    is yielded as one chunk, and a completed stream is written back to the cache.
+    A direct (computed) answer is yielded as one chunk. In fan-out mode each
+    store's section is yielded as soon as it is ready.
+    """
+    span = NodeSpan("generate_response")
+    try:
+        with tracing_v2_enabled():
+            with active_span(span):
+                answer = _direct_answer(state)
+            if answer is not None:
+                yield answer
+                return
+            if should_fan_out(state):
+                yield from _stream_fan_out(state, span)
+                return
+            with active_span(span):
+                answer, messages, cache_key = _prepare_response(state)
+            if answer is not None:
+                yield answer
+                return
+
+            parts = []
+            try:
+                stream = client.chat.completions.create(
+                    **_llm_request(messages, stream=True, stream_options={"include_usage": True})
+                )
+                for chunk in stream:
+                    if getattr(chunk, "usage", None) is not None:
+                        span.annotate(prompt_tokens=chunk.usage.prompt_tokens,
+                                      completion_tokens=chunk.usage.completion_tokens)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not parts:
+                            span.annotate(ttft_ms=round((time.perf_counter() - span.started) * 1000, 3))
+                        parts.append(delta)
+                        yield delta
+            except Exception as e:
+                span.annotate(error=str(e))
+                yield f"\n\n{RESPONSE_ERROR_PREFIX}: {str(e)}"
+                return
+
+            response_cache.set(cache_key, "".join(parts).strip())
+    finally:
+        span.finish()
+
+def _stream_fan_out(state: dict, span: NodeSpan):
+    with active_span(span):
+        jobs = _submit_store_jobs(state)
+    by_store = {}
+    # Sections go out in store order (as assemble_fanout_answer lays them out), each as soon as it and the ones before it are done
+    for future, store in sorted(jobs.items(), key=lambda kv: kv[1]):
+        by_store[store] = future.result()
+        if len(by_store) == 1:
+            span.annotate(ttft_ms=round((time.perf_counter() - span.started) * 1000, 3))
+        yield f"### {store}\n{by_store[store][0]}\n\n"
+
+    sections = [(store, by_store[store][0]) for store in sorted(by_store)]
+    summary, summary_usage = _summarize_stores(state, sections)
+    if summary:
+        yield f"### Cross-store summary\n{summary}"
+
+    with active_span(span):
+        annotate(rows_in=len(state["context_df"]))
+        _annotate_fanout([by_store[store] for store in sorted(by_store)], summary_usage)
 
-# ✅ Export as LangGraph Runnable
 # ✅ Export as LangGraph Runnable
 from langchain_core.runnables import RunnableLambda
-response_node = RunnableLambda(response_agent_node)
+response_node = RunnableLambda(
+    instrument_node("generate_response")(response_agent_node),
+    afunc=instrument_node("generate_response")(aresponse_agent_node)
+)
 
 
@@ -1,7 +1,8 @@
 # === retrieval_agent_node.py ===
 import pandas as pd
-from fuzzywuzzy import process
 from langchain_core.runnables import RunnableLambda
+from agents.kpi_index import get_kpi_index
+from agents.instrumentation import annotate, debug_print, instrument_node
 
 # === KPI Normalization Mapping ===
 KPI_MAPPING = {
@@ -13,6 +14,8 @@ KPI_MAPPING = {
     "AVERAGE BILL VALUE": "AVERAGE BILL VALUE",
 }
 
+CAUSAL_KPIS = ["NET SALES", "NUMBER OF BILLS", "AVERAGE BILL VALUE", "AVAILABILITY"]
+
 def normalize_kpis(mentioned_kpis):
     normalized = []
     for kpi in mentioned_kpis:
@@ -21,27 +24,50 @@ def normalize_kpis(mentioned_kpis):
         normalized.append(norm_kpi)
     return normalized
 
-def fuzzy_match_store_names(df, store_names, threshold=80):
-    all_stores = df["Store Name"].astype(str).str.strip().str.upper().unique().tolist()
-    matched = []
-    for s in store_names:
-        s_norm = s.strip().upper()
-        match, score = process.extractOne(s_norm, all_stores)
-        if score >= threshold:
-            matched.append(match)
-    return matched
+def build_causal_facts(df: pd.DataFrame, target_date=None) -> list:
+    """
+    One line per (store, KPI) on the target date (default: each store's latest
+    date) from the precomputed rolling features, so the model doesn't have to
+    recompute 7-day averages or spot anomalies itself.
+    """
+    if df.empty or "Z-Score" not in df.columns:
+        return []
+    if target_date is not None:
+        day = df[df["Date"] == target_date]
+    else:
+        day = df[df["Date"] == df.groupby("Store Name", observed=True)["Date"].transform("max")]
+
+    facts = []
+    for r in day.to_dict("records"):
+        value, mean = r["KPI Value"], r["Rolling 7D Mean"]
+        if pd.isna(value):
+            continue
+        line = f"{r['Store Name']} · {r['KPI Name']} on {pd.Timestamp(r['Date']).date()}: {value:,.2f}"
+        if not pd.isna(mean) and mean:
+            line += f" vs prior 7-day avg {mean:,.2f} ({(value - mean) / abs(mean) * 100:+.1f}%)"
+        if not pd.isna(r["DoD Delta"]):
+            line += f", day-over-day {r['DoD Delta']:+,.2f}"
+        if not pd.isna(r["Z-Score"]):
+            line += f", z={r['Z-Score']:+.2f}"
+        flag = r["Anomaly Flag"]
+        if flag:
+            line += " → ANOMALOUS DROP" if flag < 0 else " → ANOMALOUS SPIKE"
+        facts.append(line)
+    return facts
+
+def fuzzy_match_store_names(df, store_names, threshold=None):
+    return get_kpi_index(df).match_stores(store_names, threshold)
 
 def retrieve_context_node(state: dict) -> dict:
-    print("\n🔍 [RETRIEVAL DEBUG] Keys in state:", list(state.keys()))
-    print("Structured:", state.get("structured"))
+    debug_print("\n🔍 [RETRIEVAL DEBUG] Keys in state:", list(state.keys()))
+    debug_print("Structured:", state.get("structured"))
 
-    # ✅ Load the base dataframe
-    df = state["df"]
-    df['Date'] = pd.to_datetime(df['Date'])
-    df['Store Name'] = df['Store Name'].astype(str).str.strip().str.upper()
-    df['KPI Name'] = df['KPI Name'].astype(str).str.strip().str.upper()
+    # ✅ Use the prebuilt index (built once per loaded frame, never mutated)
+    index = state.get("kpi_index")
+    if index is None:
+        index = get_kpi_index(state["df"])
 
-    print("Before filtering → Rows:", len(df))
+    debug_print("Before filtering → Rows:", len(index))
 
     # ✅ ✅ ✅ STEP 2: UNPACK STRUCTURED QUERY IF PRESENT
     structured = state.get("structured", {})
@@ -59,40 +85,42 @@ def retrieve_context_node(state: dict) -> dict:
     important_dates = pd.to_datetime(structured.get("important_dates", state_important_dates))
     mentioned_kpis = structured.get("mentioned_kpis", state_kpis)
 
-    # ✅ Filter logic (no changes here)
-    if store_names:
-        matched_store_names = fuzzy_match_store_names(df, store_names)
-        df = df[df['Store Name'].isin(matched_store_names)]
+    # ✅ Translate the strategy into an index lookup (same rules as before)
+    stores = index.match_stores(store_names) if store_names else None
+    kpis = None
+    start = end = dates = None
 
     if strategy == "single_date_analysis" and not important_dates.empty:
         target_date = important_dates[0]
-        df = df[(df['Date'] >= target_date - pd.Timedelta(days=2)) & (df['Date'] <= target_date)]
+        start, end = target_date - pd.Timedelta(days=2), target_date
 
     elif strategy == "compare_dates" and len(important_dates) >= 2:
-        df = df[df['Date'].isin(important_dates)]
+        dates = important_dates
 
     elif strategy in ["trend_analysis", "full_range"] and start_date and end_date:
-        df = df[(df['Date'] >= start_date) & (df['Date'] <= end_date)]
+        start, end = start_date, end_date
 
     elif strategy == "causal_analysis":
-        causal_kpis = ["NET SALES", "NUMBER OF BILLS", "AVERAGE BILL VALUE", "AVAILABILITY"]
+        kpis = CAUSAL_KPIS
         if not important_dates.empty:
             target_date = important_dates[0]
-            df = df[(df['Date'] >= target_date - pd.Timedelta(days=7)) & (df['Date'] <= target_date) & (df['KPI Name'].isin(causal_kpis))]
-        else:
-            df = df[df['KPI Name'].isin(causal_kpis)]
+            start, end = target_date - pd.Timedelta(days=7), target_date
 
     if strategy == "trend_analysis" and mentioned_kpis:
-        normalized_kpis = normalize_kpis(mentioned_kpis)
-        df = df[df['KPI Name'].isin(normalized_kpis)]
+        kpis = normalize_kpis(mentioned_kpis)
+
+    df = index.select(stores=stores, kpis=kpis, start=start, end=end, dates=dates)
+    debug_print("After filtering → Rows:", len(df))
+    annotate(rows_in=len(index), rows_out=len(df))
 
-    df = df.sort_values(by=['Store Name', 'Date'])
-    print("After filtering → Rows:", len(df))
+    causal_facts = []
+    if strategy == "causal_analysis":
+        causal_facts = build_causal_facts(df, important_dates[0] if not important_dates.empty else None)
 
-    return {**state, "context_df": df}
+    return {**state, "context_df": df, "causal_facts": causal_facts}
 
 
 # ✅ LangGraph-compatible node
 # ✅ Export as LangGraph-compatible node
 from langchain_core.runnables import RunnableLambda
-retrieval_node = RunnableLambda(retrieve_context_node)
+retrieval_node = RunnableLambda(instrument_node("retrieve_context")(retrieve_context_node))
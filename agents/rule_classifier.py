@@ -0,0 +1,175 @@
+# === rule_classifier.py ===
+import re
+from datetime import date, timedelta
+
+from agents.retrieval_agent_node import KPI_MAPPING
+
+# Minimum confidence for the rule parser's answer to be used instead of the LLM
+RULE_CONFIDENCE_THRESHOLD = 0.8
+
+# === KPI aliases (longest first so "net sales" wins over "sales") ===
+KPI_ALIASES = sorted(
+    set(KPI_MAPPING) | {"NUMBER OF BILLS", "AVAILABILITY", "BASKET BUILDER AVAILABILITY", "JIOMART SLA ADHERENCE"},
+    key=len,
+    reverse=True,
+)
+
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3, "apr": 4, "april": 4,
+    "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7, "aug": 8, "august": 8,
+    "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10, "nov": 11, "november": 11,
+    "dec": 12, "december": 12,
+}
+_MONTH_RE = "|".join(sorted(MONTHS, key=len, reverse=True))
+
+MTD_RE = re.compile(r"\b(mtd|month to date|month-to-date|till date|this month)\b")
+CAUSAL_RE = re.compile(r"\b(why|reason|reasons|cause|caused|down|drop|dropped|dip|dipped|decline|declined|fall|fell|low)\b")
+COMPARE_RE = re.compile(r"\b(compare|comparison|vs|versus)\b")
+TREND_RE = re.compile(r"\b(trend|trends|trending)\b")
+LAST_N_RE = re.compile(r"\b(?:last|past|previous)\s+(\d{1,3})\s+days?\b")
+LAST_WEEK_RE = re.compile(r"\b(?:last|past|previous)\s+week\b")
+ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+DAY_MONTH_RE = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?({_MONTH_RE})\b")
+MONTH_DAY_RE = re.compile(rf"\b({_MONTH_RE})\s+(\d{{1,2}})(?:st|nd|rd|th)?\b")
+ORDINAL_DAY_RE = re.compile(r"\b(\d{1,2})(st|nd|rd|th)\b")
+
+# Words that carry no information the parser could be missing. Time words
+# ("last", "this", "week", "month", ...) are not here: they only count as
+# understood when a date rule consumed them, so "last month" lowers confidence.
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "on", "in", "at", "to", "and", "or", "by", "from", "with", "between",
+    "what", "whats", "was", "were", "is", "are", "how", "did", "does", "do", "why", "give", "show", "tell",
+    "me", "my", "our", "us", "please", "store", "stores", "kpi", "kpis", "value", "values", "performance",
+    "data", "analysis", "analyse", "analyze", "trend", "trends", "trending",
+    "days", "day", "yesterday", "today", "date", "dates", "mtd",
+    "compare", "comparison", "vs", "versus", "achievement", "plan", "actual", "daily", "so", "much",
+    "reason", "reasons", "cause", "caused", "down", "drop", "dropped", "dip", "dipped", "decline",
+    "declined", "fall", "fell", "low", "all", "across", "has", "been", "it", "its", "be", "summary",
+}
+
+
+def _find_dates(text: str, today: date):
+    found = []
+    for y, m, d in ISO_DATE_RE.findall(text):
+        found.append(date(int(y), int(m), int(d)))
+    for d, mon in DAY_MONTH_RE.findall(text):
+        found.append(date(today.year, MONTHS[mon], int(d)))
+    for mon, d in MONTH_DAY_RE.findall(text):
+        found.append(date(today.year, MONTHS[mon], int(d)))
+    if not found:
+        for d, _ in ORDINAL_DAY_RE.findall(text):
+            found.append(date(today.year, today.month, int(d)))
+    if re.search(r"\byesterday\b", text):
+        found.append(today - timedelta(days=1))
+    if re.search(r"\btoday\b", text):
+        found.append(today)
+    return sorted(set(found))
+
+
+def rule_classify(query: str, store_resolver=None, today: str = "2025-02-28"):
+    """
+    Parse a query into KPIQuery fields with regex rules.
+
+    Returns (result, confidence). `result` is None when the query has no
+    recognizable KPI or strategy; confidence drops when words are left over
+    that the rules do not understand (e.g. an unknown store name).
+    """
+    text = " ".join(query.lower().split())
+    ref = date.fromisoformat(today)
+    leftover = set(re.findall(r"[a-z]+|\d+", text))
+
+    # === KPIs (an alias inside a longer alias already matched, e.g. "availability"
+    # within "basket builder availability", is not a separate mention) ===
+    mentioned_kpis = []
+    matched_spans = []
+    for alias in KPI_ALIASES:
+        for m in re.finditer(rf"\b{re.escape(alias.lower())}\b", text):
+            if any(lo <= m.start() and m.end() <= hi for lo, hi in matched_spans):
+                continue
+            matched_spans.append(m.span())
+            if alias not in mentioned_kpis:
+                mentioned_kpis.append(alias)
+            leftover -= set(alias.lower().split())
+    if not mentioned_kpis:
+        return None, 0.0
+
+    # === Stores ===
+    store_names = []
+    if store_resolver is not None:
+        for store, phrase in store_resolver.find_in_text(text):
+            store_names.append(store)
+            leftover -= set(re.findall(r"[a-z]+|\d+", f"{store} {phrase}".lower()))
+
+    # === Dates ===
+    try:
+        dates = _find_dates(text, ref)
+    except ValueError:
+        return None, 0.0
+    for mon in MONTHS:
+        leftover.discard(mon)
+    leftover -= {"st", "nd", "rd", "th"}
+    # Numbers are understood only as part of a date; any other number (e.g. "store 27") is unknown
+    for date_re in (ISO_DATE_RE, DAY_MONTH_RE, MONTH_DAY_RE, ORDINAL_DAY_RE):
+        for m in date_re.finditer(text):
+            leftover -= set(re.findall(r"\d+", m.group(0)))
+
+    days_back = None
+    start_date = end_date = None
+    last_n = LAST_N_RE.search(text)
+    last_week = LAST_WEEK_RE.search(text)
+    if last_n:
+        days_back = int(last_n.group(1))
+    elif last_week:
+        days_back = 7
+    if days_back:
+        start_date, end_date = ref - timedelta(days=days_back - 1), ref
+
+    mtd = MTD_RE.search(text)
+    mtd_mode = "yes" if mtd else "no"
+    for match in (last_n, last_week, mtd):
+        if match:
+            leftover -= set(match.group(0).split())
+    if mtd_mode == "yes" and start_date is None and not dates:
+        start_date, end_date = ref.replace(day=1), ref
+
+    # === Strategy ===
+    if CAUSAL_RE.search(text):
+        strategy = "causal_analysis"
+    elif COMPARE_RE.search(text) and len(dates) >= 2:
+        strategy = "compare_dates"
+    elif TREND_RE.search(text) or days_back:
+        strategy = "trend_analysis"
+        if start_date is None and len(dates) >= 2:
+            start_date, end_date = dates[0], dates[-1]
+    elif len(dates) == 1:
+        strategy = "single_date_analysis"
+    elif start_date is not None:
+        strategy = "full_range"
+    else:
+        return None, 0.0
+
+    confidence = 1.0
+    if strategy == "trend_analysis" and start_date is None:
+        confidence -= 0.5
+    if strategy == "compare_dates" and len(dates) < 2:
+        confidence -= 0.5
+    if len(dates) > 1 and strategy in ("single_date_analysis", "causal_analysis"):
+        confidence -= 0.3
+    if strategy == "causal_analysis" and not dates and start_date is None:
+        # A root cause needs a day or range to explain; let the LLM resolve it
+        confidence = min(confidence, 0.5)
+    unknown = leftover - STOPWORDS
+    if unknown:
+        confidence -= min(0.5, 0.25 * len(unknown))
+
+    result = {
+        "mentioned_kpis": mentioned_kpis,
+        "start_date": start_date.isoformat() if start_date else None,
+        "end_date": end_date.isoformat() if end_date else None,
+        "days_back": days_back,
+        "important_dates": [d.isoformat() for d in dates],
+        "retrieval_strategy": strategy,
+        "store_names": store_names,
+        "mtd_mode": mtd_mode,
+    }
+    return result, round(max(confidence, 0.0), 2)
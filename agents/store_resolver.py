@@ -0,0 +1,139 @@
+# === store_resolver.py ===
+import json
+import os
+import re
+from collections import defaultdict
+
+from fuzzywuzzy import fuzz
+
+# Optional JSON file of extra aliases: {"AMBI": "GURUGRAM AMBI MALL", ...}
+STORE_ALIASES_FILE = os.getenv("STORE_ALIASES_FILE", "data/store_aliases.json")
+STORE_MATCH_THRESHOLD = 80
+
+# Never auto-aliased on their own: ordinary words that show up in queries
+# ("the city", "all mall stores") would otherwise pin the answer to one store.
+# A store can still be reached by one of these through the alias file.
+GENERIC_STORE_WORDS = {
+    # place / address words
+    "CITY", "MALL", "NEW", "OLD", "NORTH", "SOUTH", "EAST", "WEST", "CENTRAL", "CENTRE", "CENTER", "MAIN",
+    "ROAD", "MARG", "STREET", "MARKET", "PLAZA", "SQUARE", "TOWER", "TOWERS", "PARK", "STATION", "SECTOR",
+    "PHASE", "BLOCK", "COLONY", "NAGAR", "VIHAR", "ENCLAVE", "EXTENSION", "GATE", "HUB", "UPPER", "LOWER",
+    "STORE", "STORES", "SHOP", "OUTLET", "MART", "SMART", "SUPER", "MEGA", "MINI", "EXPRESS", "POINT",
+    # KPI words
+    "NET", "SALES", "SALE", "BILL", "BILLS", "VALUE", "NUMBER", "AVERAGE", "ABV", "NOB", "AVAILABILITY",
+    "BASKET", "BUILDER", "JIOMART", "SLA", "ADHERENCE", "PLAN", "ACTUAL", "DAILY", "ACHIEVEMENT", "MTD",
+    # query words
+    "THE", "ALL", "AND", "FOR", "WITH", "FROM", "THIS", "LAST", "PAST", "PREVIOUS", "WEEK", "MONTH", "DAY",
+    "DAYS", "TODAY", "YESTERDAY", "DATE", "TREND", "WHY", "HOW", "WHAT", "SHOW", "GIVE", "TOP", "BEST", "WORST",
+}
+
+
+def _tokens(text: str) -> list:
+    return re.findall(r"[A-Z0-9]+", text.upper())
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {' '.join(_tokens(text))} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def load_alias_file(path: str = STORE_ALIASES_FILE) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {k.strip().upper(): v.strip().upper() for k, v in json.load(f).items()}
+
+
+class StoreResolver:
+    """
+    Store-name lookup built once per dataset.
+
+    1. Exact/alias dictionary: canonical names, user aliases, the name without
+       tokens most stores share (e.g. "AMBI MALL" without "GURUGRAM") and any
+       token that identifies exactly one store (e.g. "AMBI") unless it is an
+       ordinary word (GENERIC_STORE_WORDS).
+    2. Otherwise a character-trigram index picks a few candidates, and only
+       those are fuzzy-scored.
+    """
+
+    def __init__(self, stores, aliases: dict = None, threshold: int = STORE_MATCH_THRESHOLD, max_candidates: int = 8):
+        self.stores = list(dict.fromkeys(s.strip().upper() for s in stores))
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+
+        token_sets = {s: set(_tokens(s)) for s in self.stores}
+        token_counts = defaultdict(int)
+        for tokens in token_sets.values():
+            for t in tokens:
+                token_counts[t] += 1
+        common = {t for t, c in token_counts.items() if len(self.stores) > 2 and c > len(self.stores) / 2}
+
+        self.aliases = {}
+        for store, tokens in token_sets.items():
+            self.aliases[" ".join(_tokens(store))] = store
+            short = " ".join(t for t in _tokens(store) if t not in common)
+            if short and short not in GENERIC_STORE_WORDS:
+                self.aliases.setdefault(short, store)
+            for t in tokens - common - GENERIC_STORE_WORDS:
+                if token_counts[t] == 1 and len(t) >= 3 and not t.isdigit():
+                    self.aliases.setdefault(t, store)
+        for alias, store in (aliases if aliases is not None else load_alias_file()).items():
+            if store in token_sets:
+                self.aliases[" ".join(_tokens(alias))] = store
+        self._max_alias_words = max((len(a.split()) for a in self.aliases), default=1)
+
+        self._trigram_index = defaultdict(list)
+        for i, store in enumerate(self.stores):
+            for g in _trigrams(store):
+                self._trigram_index[g].append(i)
+        # Trigrams shared by many stores ("GUR", "MAL") barely discriminate; skip them when counting
+        self._common_posting = max(32, len(self.stores) // 20)
+
+    def _candidates(self, name: str) -> list:
+        postings = [self._trigram_index[g] for g in _trigrams(name) if g in self._trigram_index]
+        selective = [p for p in postings if len(p) <= self._common_posting] or postings
+        overlap = defaultdict(int)
+        for posting in selective:
+            for i in posting:
+                overlap[i] += 1
+        ranked = sorted(overlap.items(), key=lambda kv: kv[1], reverse=True)[:self.max_candidates]
+        return [self.stores[i] for i, _ in ranked]
+
+    def resolve(self, name: str, limit: int = 3) -> list:
+        """Ranked [(store, score)] for one mention; exact/alias hits score 100."""
+        key = " ".join(_tokens(name))
+        if not key:
+            return []
+        if key in self.aliases:
+            return [(self.aliases[key], 100)]
+        scored = [(store, fuzz.WRatio(key, store)) for store in self._candidates(key)]
+        scored.sort(key=lambda kv: kv[1], reverse=True)
+        return scored[:limit]
+
+    def match(self, store_names, threshold: int = None) -> list:
+        """Best store per mention, dropping mentions that score below the threshold."""
+        threshold = self.threshold if threshold is None else threshold
+        matched = []
+        for s in store_names:
+            ranked = self.resolve(s, limit=1)
+            if ranked and ranked[0][1] >= threshold:
+                matched.append(ranked[0][0])
+        return matched
+
+    def find_in_text(self, text: str) -> list:
+        """[(store, phrase)] for every store name or alias appearing as whole words in free text."""
+        words = _tokens(text)
+        found = []
+        i = 0
+        while i < len(words):
+            for n in range(min(self._max_alias_words, len(words) - i), 0, -1):
+                phrase = " ".join(words[i:i + n])
+                store = self.aliases.get(phrase)
+                if store is not None:
+                    if store not in [f[0] for f in found]:
+                        found.append((store, phrase))
+                    i += n
+                    break
+            else:
+                i += 1
+        return found
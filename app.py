@@ -1,9 +1,11 @@
 import streamlit as st
-import pandas as pd
 import os
 from dotenv import load_dotenv
-from chatbot_graph import chatbot_graph
-from chatbot_graph import run_chat_graph
+from agents.data_loader import enable_copy_on_write
+
+# The shared KPI frame is handed out as views; writes must copy instead of mutating it
+enable_copy_on_write()
+from chatbot_graph import stream_chat_graph
 
 # === Load environment variables ===
 load_dotenv()
@@ -13,39 +15,37 @@ os.environ["LANGCHAIN_API_KEY"] = os.getenv("LANGCHAIN_API_KEY")
 os.environ["LANGCHAIN_PROJECT"] = os.getenv("LANGCHAIN_PROJECT")
 os.environ["LANGCHAIN_ENDPOINT"] = os.getenv("LANGCHAIN_ENDPOINT", "https://api.smith.langchain.com")
 
-# === Load precomputed data ===
-df_precomputed = pd.read_excel("data/kpi_precomputed.xlsx")
+# === Precomputed data is loaded once per process by chatbot_graph (shared across reruns, hot-reloaded) ===
 
 # === Streamlit app config ===
 st.set_page_config(page_title="Store KPI Chatbot 💬", layout="wide")
 st.title(":bar_chart: Store Manager KPI Chatbot")
 
-# === Run the LangGraph ===
-# === Run the LangGraph ===
-def run_chat_graph(user_query: str, df: pd.DataFrame):
-    inputs = {"user_query": user_query, "df": df}
-    print("\n🔍 [DEBUG] Inputs passed to chatbot_graph:")
-    for k, v in inputs.items():
-        print(f"- {k}: type={type(v)}")
-    outputs = chatbot_graph.invoke(inputs)
-    print("\n✅ [DEBUG] Outputs returned from chatbot_graph:")
-    print(outputs)
-    return outputs["final_response"], outputs["context_df"]
-
-
-
 # === Streamlit user input ===
 user_query = st.text_input("Ask your question:")
 
 if user_query:
-    with st.spinner("🧠 Thinking..."):
-        try:
-            response, context_df = run_chat_graph(user_query, df_precomputed)
-            st.success("✅ Response:")
-            st.markdown(response)
-
-            with st.expander(":bar_chart: View Filtered Data"):
-                st.dataframe(context_df)
-
-        except Exception as e:
-            st.error(f"❌ Error occurred: {str(e)}")
+    try:
+        context_df = None
+        answer = ""
+        with st.spinner("🧠 Thinking..."):
+            events = stream_chat_graph(user_query)
+            event, payload = next(events)
+            if event == "context":
+                context_df = payload
+
+        st.success("✅ Response:")
+        placeholder = st.empty()
+        for event, payload in events:
+            if event == "token":
+                answer += payload
+                placeholder.markdown(answer)
+            elif event == "done":
+                ttft = f"{payload['ttft_s']:.2f}s" if payload["ttft_s"] is not None else "n/a"
+                st.caption(f"⏱️ First token: {ttft} · Total: {payload['total_s']:.2f}s")
+
+        with st.expander(":bar_chart: View Filtered Data"):
+            st.dataframe(context_df)
+
+    except Exception as e:
+        st.error(f"❌ Error occurred: {str(e)}")
@@ -0,0 +1,166 @@
+# === batch_runner.py ===
+# Scheduled multi-store reporting, e.g. morning briefings for the whole cluster:
+#   python batch_runner.py --template "Net Sales trend of last 7 days for {store}" --out briefings.jsonl
+#   python batch_runner.py --queries-file questions.txt --max-concurrency 16
+import argparse
+import asyncio
+import json
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# The shared KPI frame is handed out as views; writes must copy instead of mutating it
+from agents.data_loader import enable_copy_on_write
+enable_copy_on_write()
+
+from chatbot_graph import dataset
+from agents.query_classifier_node import aclassify_query_node
+from agents.retrieval_agent_node import retrieve_context_node
+from agents.response_agent_node import RESPONSE_ERROR_PREFIX, aresponse_agent_node, store_facts
+from agents.llm_clients import close_async_client
+
+
+def _base_state(user_query: str, snapshot) -> dict:
+    return {"user_query": user_query, "df": snapshot.df, "kpi_index": snapshot.index}
+
+
+def _item_result(query: str, store: str = None) -> dict:
+    return {"query": query, "store": store, "status": "pending", "response": None,
+            "error": None, "context_rows": 0, "latency_s": None}
+
+
+async def _generate(item: dict, state: dict, semaphore: asyncio.Semaphore, prior_s: float = 0.0):
+    """Answer one item; its latency_s is its own work (prior_s + generation), not time queued for a slot."""
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            out = await aresponse_agent_node(state)
+            answer = out["final_response"]
+            if answer.startswith(RESPONSE_ERROR_PREFIX):
+                item.update(status="error", error=answer)
+            else:
+                item.update(status="ok", response=answer)
+        except Exception as e:
+            item.update(status="error", error=str(e))
+        item["latency_s"] = round(prior_s + time.perf_counter() - started, 3)
+
+
+async def arun_template_batch(template: str, stores=None, max_concurrency: int = 8) -> list:
+    """
+    Run one query template (with a `{store}` placeholder) for many stores.
+
+    The template is classified once, the index is read once for all stores,
+    and per-store generations run with at most `max_concurrency` in flight.
+    """
+    snapshot = dataset.current()  # the whole batch reads one dataset version
+    kpi_index = snapshot.index
+    stores = list(stores) if stores else list(kpi_index.stores)
+    items = [_item_result(template.format(store=s), s) for s in stores]
+
+    # ✅ Classify once, with the store slot left empty
+    try:
+        classified = await aclassify_query_node(_base_state(" ".join(template.format(store="").split()), snapshot))
+    except Exception as e:
+        for item in items:
+            item.update(status="error", error=f"classification failed: {e}")
+        return items
+    structured = classified["structured"]
+
+    # ✅ One index lookup covering every store in the batch, then split per store
+    canonical = {s: (kpi_index.match_stores([s]) or [None])[0] for s in stores}
+    retrieved = retrieve_context_node({
+        **_base_state(template, snapshot),
+        "structured": {**structured, "store_names": [c for c in dict.fromkeys(canonical.values()) if c]},
+    })
+    shared = retrieved["context_df"]
+    context_by_store = {name: frame for name, frame in shared.groupby("Store Name", sort=False, observed=True)}
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = []
+    for item in items:
+        store = canonical[item["store"]]
+        if store is None:
+            item.update(status="error", error=f"❌ Store not found: {item['store']}")
+            continue
+        context_df = context_by_store.get(store, shared.iloc[0:0])
+        item["context_rows"] = len(context_df)
+        state = {
+            **_base_state(item["query"], snapshot),
+            "structured": {**structured, "user_query": item["query"], "store_names": [store]},
+            "context_df": context_df,
+            "causal_facts": store_facts(retrieved.get("causal_facts"), store),
+        }
+        tasks.append(_generate(item, state, semaphore))
+
+    await asyncio.gather(*tasks)
+    return items
+
+
+async def arun_query_batch(queries, max_concurrency: int = 8) -> list:
+    """Run independent queries; classification and generation run concurrently, bounded."""
+    snapshot = dataset.current()
+    items = [_item_result(q) for q in queries]
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(item):
+        try:
+            async with semaphore:
+                started = time.perf_counter()
+                state = await aclassify_query_node(_base_state(item["query"], snapshot))
+            state = retrieve_context_node(state)
+            item["context_rows"] = len(state["context_df"])
+        except Exception as e:
+            item.update(status="error", error=str(e), latency_s=round(time.perf_counter() - started, 3))
+            return
+        await _generate(item, state, semaphore, time.perf_counter() - started)
+
+    await asyncio.gather(*(run_one(item) for item in items))
+    return items
+
+
+def run_batch(queries=None, template: str = None, stores=None, max_concurrency: int = 8) -> list:
+    """Synchronous entry point: pass either `queries` or a `template` (+ optional `stores`)."""
+    async def _main():
+        try:
+            if template:
+                return await arun_template_batch(template, stores, max_concurrency)
+            return await arun_query_batch(queries or [], max_concurrency)
+        finally:
+            await close_async_client()
+
+    return asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch KPI queries for scheduled reporting")
+    parser.add_argument("--template", help='query with a "{store}" placeholder, run for every store')
+    parser.add_argument("--stores", nargs="*", help="limit --template to these stores (default: all)")
+    parser.add_argument("--queries-file", help="one query per line")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--out", help="write per-item results as JSONL")
+    args = parser.parse_args()
+
+    if not args.template and not args.queries_file:
+        parser.error("pass --template or --queries-file")
+
+    queries = None
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    t0 = time.perf_counter()
+    results = run_batch(queries=queries, template=args.template, stores=args.stores,
+                        max_concurrency=args.max_concurrency)
+    elapsed = time.perf_counter() - t0
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for item in results:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    failed = [r for r in results if r["status"] != "ok"]
+    print(f"✅ {len(results) - len(failed)}/{len(results)} succeeded in {elapsed:.1f}s")
+    for r in failed:
+        print(f"❌ {r['store'] or r['query']}: {r['error']}")
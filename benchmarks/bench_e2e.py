@@ -0,0 +1,254 @@
+# === bench_e2e.py ===
+# End-to-end benchmark against synthetic data and a local fake OpenAI server.
+# Usage: python -m benchmarks.bench_e2e [--stores 200 --kpis 6 --days 90 --queries 50 --concurrency 8 --json out.json]
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.fake_openai import start_fake_openai
+from benchmarks.synthetic_data import make_raw_kpi_frame
+
+PERCENTILES = (50, 90, 95, 99)
+
+QUERY_TEMPLATES = [
+    "How did net sales trend for {store} last week?",
+    "What was the achievement % of {store} on 25 Feb?",
+    "Compare number of bills for {store} and {other} in the last 7 days",
+    "Why did net sales drop for {store} yesterday?",
+    "Show availability for {store} this month",
+    "which stores are doing badly lately",  # vague → LLM classifier
+]
+
+
+def summarize(samples_ms) -> dict:
+    if not len(samples_ms):
+        return {"n": 0}
+    values = np.asarray(samples_ms, dtype=float)
+    out = {"n": len(values), "mean": round(float(values.mean()), 3)}
+    for p in PERCENTILES:
+        out[f"p{p}"] = round(float(np.percentile(values, p)), 3)
+    return out
+
+
+def make_queries(stores: list, n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    queries = []
+    for i in range(n):
+        store, other = rng.sample(stores, 2) if len(stores) > 1 else (stores[0], stores[0])
+        queries.append(QUERY_TEMPLATES[i % len(QUERY_TEMPLATES)].format(store=store.title(), other=other.title()))
+    return queries
+
+
+def read_trace(path: str) -> dict:
+    """Exact per-node wall times (ms) from the instrumentation JSONL trace, then truncate it."""
+    per_node = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                per_node.setdefault(record["node"], []).append(record["wall_ms"])
+        open(path, "w").close()
+    return per_node
+
+
+def bench_precompute(raw, output_file: str) -> tuple:
+    from agents.data_loader import write_arrow
+    from agents.precomputed_agent import precompute_advanced_kpi_metrics
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    df = precompute_advanced_kpi_metrics(raw)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    write_arrow(df, output_file)
+    return {"rows": len(df), "seconds": round(elapsed, 4), "peak_mb": round(peak / 2**20, 2)}
+
+
+def bench_startup(env: dict) -> dict:
+    """Import chatbot_graph in a fresh interpreter: data load + index build + graph compile."""
+    code = (
+        "import time; t = time.perf_counter(); import chatbot_graph; "
+        "print(time.perf_counter() - t)"
+    )
+    before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    seconds = float(out.stdout.strip().splitlines()[-1])
+    return {"seconds": round(seconds, 4), "max_rss_mb": round(max(max_rss, before) / 1024, 1)}
+
+
+def bench_retrieval(graph_module, queries: list) -> dict:
+    from agents.query_classifier_node import classify_query_node
+    from agents.retrieval_agent_node import retrieve_context_node
+
+    states = []
+    for q in queries:
+        state = graph_module.initial_state(q)
+        state.update(classify_query_node(state))
+        states.append(state)
+
+    samples = []
+    for state in states:
+        started = time.perf_counter()
+        retrieve_context_node(state)
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def clear_llm_caches():
+    from agents.query_classifier_node import classification_cache
+    from agents.response_agent_node import response_cache
+    classification_cache.clear()
+    response_cache.clear()
+
+
+def llm_cache_hits() -> dict:
+    """Cumulative (hits, lookups) per LLM cache."""
+    from agents.query_classifier_node import classification_cache
+    from agents.response_agent_node import response_cache
+    out = {}
+    for cache in (classification_cache, response_cache):
+        s = cache.stats()
+        hits = s["memory_hits"] + s["disk_hits"]
+        out[s["name"]] = (hits, hits + s["misses"])
+    return out
+
+
+def cache_hit_rates(before: dict, after: dict) -> dict:
+    rates = {}
+    for name, (hits, lookups) in after.items():
+        hits, lookups = hits - before[name][0], lookups - before[name][1]
+        rates[name] = round(hits / lookups, 4) if lookups else 0.0
+    return rates
+
+
+def bench_graph(graph_module, queries: list, use_cache: bool) -> dict:
+    samples = []
+    for q in queries:
+        if not use_cache:
+            clear_llm_caches()
+        started = time.perf_counter()
+        graph_module.chatbot_graph.invoke(graph_module.initial_state(q))
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+async def _throughput(graph_module, queries: list, concurrency: int) -> dict:
+    gate = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(q):
+        async with gate:
+            started = time.perf_counter()
+            await graph_module.chatbot_graph.ainvoke(graph_module.initial_state(q))
+            samples.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    elapsed = time.perf_counter() - started
+
+    from agents.llm_clients import close_async_client
+    await close_async_client()
+    return {"concurrency": concurrency, "seconds": round(elapsed, 4),
+            "qps": round(len(queries) / elapsed, 2), "latency_ms": summarize(samples)}
+
+
+def print_table(title: str, rows: dict):
+    print(f"\n{title}")
+    print(f"{'':<28} {'n':>5} {'mean':>9} " + " ".join(f"{'p' + str(p):>9}" for p in PERCENTILES))
+    for name, s in rows.items():
+        if not s.get("n"):
+            continue
+        print(f"{name:<28} {s['n']:>5} {s['mean']:>9.2f} " + " ".join(f"{s[f'p{p}']:>9.2f}" for p in PERCENTILES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency/throughput benchmark with a fake LLM")
+    parser.add_argument("--stores", type=int, default=200)
+    parser.add_argument("--kpis", type=int, default=6)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM latency before the first byte (s)")
+    parser.add_argument("--token-delay", type=float, default=0.002)
+    parser.add_argument("--no-cache", action="store_true", help="clear LLM caches before every graph query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="kpi_bench_")
+    data_file = os.path.join(workdir, "kpi_precomputed.arrow")
+    trace_file = os.path.join(workdir, "trace.jsonl")
+    server, base_url, fake = start_fake_openai(latency_s=args.latency, token_delay_s=args.token_delay)
+
+    # Must be set before any agents.* module that reads them is imported
+    os.environ.update({
+        "KPI_DATA_FILE": data_file,
+        "KPI_CACHE_DIR": os.path.join(workdir, "cache"),
+        "KPI_TRACE_FILE": trace_file,
+        "INTERACTION_LOG_DB": os.path.join(workdir, "interactions.sqlite3"),
+        "KPI_RELOAD_SECONDS": "0",
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "fake-key"),
+        "LANGCHAIN_TRACING_V2": "false",
+        "LANGSMITH_TRACING": "false",
+    })
+
+    results = {"scale": {"stores": args.stores, "kpis": args.kpis, "days": args.days}, "fake_llm": base_url}
+    print(f"🔄 Generating {args.stores} stores × {args.kpis} KPIs × {args.days} days...")
+    raw = make_raw_kpi_frame(args.stores, args.kpis, args.days, seed=args.seed)
+    results["precompute"] = bench_precompute(raw, data_file)
+    print(f"✅ precompute: {results['precompute']}")
+
+    results["startup"] = bench_startup(dict(os.environ))
+    print(f"✅ startup: {results['startup']}")
+
+    import chatbot_graph as graph_module
+    queries = make_queries(list(graph_module.dataset.current().index.stores), args.queries, args.seed)
+    read_trace(trace_file)
+
+    results["retrieve_context_node_ms"] = bench_retrieval(graph_module, queries)
+    read_trace(trace_file)
+
+    results["graph_ms"] = bench_graph(graph_module, queries, use_cache=not args.no_cache)
+    results["graph_nodes_ms"] = {node: summarize(v) for node, v in read_trace(trace_file).items()}
+
+    # bench_graph has just answered these exact queries; measure generation, not cache hits
+    clear_llm_caches()
+    before = llm_cache_hits()
+    results["throughput"] = asyncio.run(_throughput(graph_module, queries, args.concurrency))
+    results["throughput"]["cache_hit_rate"] = cache_hit_rates(before, llm_cache_hits())
+    read_trace(trace_file)
+    results["fake_llm_requests"] = fake.requests
+    server.shutdown()
+
+    print_table("Latency (ms)", {
+        "retrieve_context_node": results["retrieve_context_node_ms"],
+        "chatbot_graph": results["graph_ms"],
+        **{f"  node:{k}": v for k, v in results["graph_nodes_ms"].items()},
+        f"async x{args.concurrency}": results["throughput"]["latency_ms"],
+    })
+    print(f"\nThroughput: {results['throughput']['qps']} q/s at concurrency {args.concurrency}"
+          f" ({args.queries} queries in {results['throughput']['seconds']}s,"
+          f" cache hit rate {results['throughput']['cache_hit_rate']})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
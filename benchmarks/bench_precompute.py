@@ -0,0 +1,73 @@
+# === bench_precompute.py ===
+# Usage: python -m benchmarks.bench_precompute [--repeat 3]
+import argparse
+import time
+
+import pandas as pd
+
+from agents.precomputed_agent import precompute_advanced_kpi_metrics
+from benchmarks.synthetic_data import make_raw_kpi_frame
+
+# (stores, KPIs, days)
+SCALES = [
+    (10, 6, 30),
+    (50, 6, 60),
+    (200, 6, 90),
+    (200, 20, 365),
+    (1000, 10, 365),
+]
+
+DERIVED = ["Daily Plan", "Daily Actual", "Daily Achievement %"]
+
+
+def legacy_precompute(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pre-vectorization per-KPI loop, kept only as a baseline and correctness oracle.
+    Diffs restart each month (Plan/Actual are month-to-date), as in the vectorized version.
+    """
+    df = df.copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df['Month'] = df['Date'].dt.to_period('M')
+    df = df.sort_values(by=['Store Name', 'KPI Name', 'Date'])
+    for kpi in df['KPI Name'].unique():
+        kpi_df = df[df['KPI Name'] == kpi].copy()
+        kpi_df['Daily Plan'] = kpi_df.groupby(['Store Name', 'KPI Name', 'Month'])['Plan'].diff().fillna(kpi_df['Plan'])
+        kpi_df['Daily Actual'] = kpi_df.groupby(['Store Name', 'KPI Name', 'Month'])['Actual'].diff().fillna(kpi_df['Actual'])
+        kpi_df['Daily Achievement %'] = (kpi_df['Daily Actual'] / kpi_df['Daily Plan']) * 100
+        kpi_df['Daily Achievement %'] = kpi_df['Daily Achievement %'].round(2)
+        df.loc[kpi_df.index, DERIVED] = kpi_df[DERIVED]
+    return df.drop(columns='Month')
+
+
+def _best_of(fn, df, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(df)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark for precompute_advanced_kpi_metrics")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the vectorized version")
+    args = parser.parse_args()
+
+    print(f"{'stores':>7} {'kpis':>5} {'days':>5} {'rows':>11} {'vectorized s':>13} {'legacy s':>10} {'speedup':>8}")
+    for n_stores, n_kpis, n_days in SCALES:
+        raw = make_raw_kpi_frame(n_stores, n_kpis, n_days)
+        new_s, new_df = _best_of(precompute_advanced_kpi_metrics, raw, args.repeat)
+
+        if args.skip_legacy:
+            print(f"{n_stores:>7} {n_kpis:>5} {n_days:>5} {len(raw):>11,} {new_s:>13.3f} {'-':>10} {'-':>8}")
+            continue
+
+        old_s, old_df = _best_of(legacy_precompute, raw, 1)
+        pd.testing.assert_frame_equal(new_df[old_df.columns], old_df)
+        print(f"{n_stores:>7} {n_kpis:>5} {n_days:>5} {len(raw):>11,} {new_s:>13.3f} {old_s:>10.3f} {old_s / new_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
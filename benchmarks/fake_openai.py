@@ -0,0 +1,151 @@
+# === fake_openai.py ===
+# Minimal OpenAI-compatible /v1/chat/completions server for benchmarks and offline runs.
+#   python -m benchmarks.fake_openai --port 8089 --latency 0.4 --token-delay 0.01
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake streamlit run app.py
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_CLASSIFICATION = {
+    "mentioned_kpis": ["NET SALES"],
+    "start_date": "2025-02-22",
+    "end_date": "2025-02-28",
+    "days_back": 7,
+    "important_dates": [],
+    "retrieval_strategy": "trend_analysis",
+    "store_names": [],
+    "mtd_mode": "no",
+}
+
+CANNED_ANSWER = (
+    "Net Sales showed a steady trend across the period. Daily Achievement % stayed close to plan, "
+    "with a dip on the last day that data suggests was driven by lower Number of Bills. "
+    "Average Bill Value held steady, so the shortfall looks footfall-led rather than basket-led."
+)
+
+
+class FakeOpenAIConfig:
+    def __init__(self, latency_s: float = 0.3, jitter_s: float = 0.05, token_delay_s: float = 0.005,
+                 classification: dict = None, answer: str = CANNED_ANSWER):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.token_delay_s = token_delay_s
+        self.classification = classification or CANNED_CLASSIFICATION
+        self.answer = answer
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+
+def _completion(model: str, content: str, prompt_tokens: int) -> dict:
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def _chunk(model: str, cid: str, delta: dict, finish=None, usage=None) -> bytes:
+    body = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if usage is None else []}
+    if usage is not None:
+        body["usage"] = usage
+    return f"data: {json.dumps(body)}\n\n".encode("utf-8")
+
+
+def make_handler(config: FakeOpenAIConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            config.count()
+
+            messages = payload.get("messages", [])
+            prompt = "\n".join(str(m.get("content", "")) for m in messages)
+            prompt_tokens = max(1, len(prompt) // 4)
+            model = payload.get("model", "fake")
+            is_classifier = "query classification assistant" in prompt
+            content = json.dumps(config.classification) if is_classifier else config.answer
+
+            time.sleep(max(0.0, config.latency_s + random.uniform(-config.jitter_s, config.jitter_s)))
+
+            if not payload.get("stream"):
+                body = json.dumps(_completion(model, content, prompt_tokens)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send(data: bytes):
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            send(_chunk(model, cid, {"role": "assistant", "content": ""}))
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                time.sleep(config.token_delay_s)
+                send(_chunk(model, cid, {"content": word + (" " if i < len(words) - 1 else "")}))
+            send(_chunk(model, cid, {}, finish="stop"))
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                completion_tokens = max(1, len(content) // 4)
+                send(_chunk(model, cid, {}, usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                                   "total_tokens": prompt_tokens + completion_tokens}))
+            send(b"data: [DONE]\n\n")
+            send(b"")
+
+    return Handler
+
+
+def start_fake_openai(host: str = "127.0.0.1", port: int = 0, **config_kwargs):
+    """Start the fake server on a background thread. Returns (server, base_url, config)."""
+    config = FakeOpenAIConfig(**config_kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1", config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.005, help="seconds between streamed words")
+    args = parser.parse_args()
+
+    server, url, _ = start_fake_openai(args.host, args.port, latency_s=args.latency,
+                                       jitter_s=args.jitter, token_delay_s=args.token_delay)
+    print(f"✅ Fake OpenAI listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,68 @@
+# === synthetic_data.py ===
+import numpy as np
+import pandas as pd
+
+from agents.precomputed_agent import RATIO_KPIS
+
+DEFAULT_KPIS = [
+    "NET SALES",
+    "NUMBER OF BILLS",
+    "AVERAGE BILL VALUE",
+    "AVAILABILITY",
+    "BASKET BUILDER AVAILABILITY",
+    "JIOMART SLA ADHERENCE",
+]
+
+
+def make_raw_kpi_frame(n_stores: int, n_kpis: int, n_days: int, end_date: str = "2025-02-28", seed: int = 0) -> pd.DataFrame:
+    """
+    Raw cluster sheet in the `Store Name`/`KPI Name`/`Date`/`Plan`/`Actual` schema.
+
+    Plan and Actual are month-to-date values that reset on the 1st, matching
+    the Gurugram Cluster export: running totals for additive KPIs, running
+    averages for RATIO_KPIS (bill value, availability and SLA percentages).
+    Rows come back shuffled.
+    """
+    rng = np.random.default_rng(seed)
+    stores = [f"GURUGRAM STORE {i:04d}" for i in range(n_stores)]
+    kpis = [DEFAULT_KPIS[i] if i < len(DEFAULT_KPIS) else f"KPI {i:03d}" for i in range(n_kpis)]
+    dates = pd.date_range(end=end_date, periods=n_days, freq="D")
+
+    n_series = n_stores * n_kpis
+    is_ratio = np.tile([k in RATIO_KPIS for k in kpis], n_stores)
+    daily_plan = rng.uniform(50_000, 150_000, size=(n_series, n_days)).round(2)
+    daily_actual = (daily_plan * rng.normal(1.0, 0.15, size=(n_series, n_days))).round(2)
+    # Ratio KPIs: a steady per-series level (e.g. ₹520 bill value, 92% availability) with small daily noise
+    is_percent = is_ratio & np.tile([k != "AVERAGE BILL VALUE" for k in kpis], n_stores)
+    level = np.where(is_percent, rng.uniform(85, 98, size=n_series), rng.uniform(350, 700, size=n_series))[:, None]
+    cap = np.where(is_percent, 100.0, np.inf)[:, None]
+    ratio_plan = np.minimum(level * 1.02, cap).round(2)
+    ratio_actual = np.minimum(level * rng.normal(1.0, 0.03, size=(n_series, n_days)), cap).round(2)
+    daily_plan[is_ratio] = np.broadcast_to(ratio_plan, (n_series, n_days))[is_ratio]
+    daily_actual[is_ratio] = ratio_actual[is_ratio]
+
+    # MTD cumulation restarting at every month boundary; ratio KPIs average instead of summing
+    month_id = (dates.year * 12 + dates.month).to_numpy()
+    month_start = np.concatenate(([True], month_id[1:] != month_id[:-1]))
+    segment = np.cumsum(month_start) - 1
+    plan = np.zeros_like(daily_plan)
+    actual = np.zeros_like(daily_actual)
+    for seg in np.unique(segment):
+        cols = segment == seg
+        plan[:, cols] = np.cumsum(daily_plan[:, cols], axis=1)
+        actual[:, cols] = np.cumsum(daily_actual[:, cols], axis=1)
+        # Averages are over calendar days; days before the first generated date sit at the series' level
+        day_of_month = dates[cols].day.to_numpy()
+        earlier = day_of_month[0] - 1
+        for mtd, daily in ((plan, daily_plan), (actual, daily_actual)):
+            ratio = np.ix_(is_ratio, cols)
+            mtd[ratio] = ((mtd[ratio] + earlier * daily[is_ratio][:, :1]) / day_of_month).round(2)
+
+    df = pd.DataFrame({
+        "Store Name": np.repeat(np.repeat(stores, n_kpis), n_days),
+        "KPI Name": np.repeat(np.tile(kpis, n_stores), n_days),
+        "Date": np.tile(dates.to_numpy(), n_series),
+        "Plan": plan.ravel(),
+        "Actual": actual.ravel(),
+    })
+    return df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
@@ -3,23 +3,42 @@ from langgraph.graph.message import add_messages
 from langchain_core.runnables import Runnable
 from typing import Annotated, TypedDict
 from pydantic import BaseModel
+import time
 import pandas as pd
 
 # ✅ Node imports
-from agents.query_classifier_node import query_classifier_node
+from agents.query_classifier_node import get_classifier_backend, query_classifier_node
 from agents.retrieval_agent_node import retrieval_node
-from agents.response_agent_node import response_node
+from agents.response_agent_node import response_cache, response_node, stream_response_tokens
+from agents.kpi_index import KPIIndex, get_kpi_index
+from agents.dataset import get_dataset
+from agents.instrumentation import debug_print
 
-# ✅ Load data
-df_precomputed = pd.read_excel("data/kpi_precomputed.xlsx")
+# ✅ Load data once per process (Arrow cache, XLSX parsed only when it changes) as a compact,
+# read-only snapshot shared by every session, and swap in new files as they land
+dataset = get_dataset()
+dataset.start_watching()
+
+@dataset.on_swap
+def _drop_stale_responses(old, new):
+    # Cached answers are keyed on the dataset version; none of the old ones can hit again
+    response_cache.clear()
+    print(f"♻️ Dataset {old.version[:12]} → {new.version[:12]}, response cache cleared")
+
+# ✅ Load (and warm, for a local model) the classifier backend now rather than on the first query
+get_classifier_backend()
 
 # ✅ Define LangGraph state
 class ChatState(TypedDict):
     user_query: str
     df: pd.DataFrame
+    kpi_index: KPIIndex
     structured: dict
+    classification_path: str
     context_df: pd.DataFrame
+    causal_facts: list
     final_response: str
+    fanout: bool
 
 # ✅ Build LangGraph
 graph = StateGraph(ChatState)
@@ -35,8 +54,47 @@ graph.add_edge("generate_response", END)
 # ✅ Compile graph
 chatbot_graph = graph.compile()
 
+# ✅ Same pipeline without generation, used when the answer is streamed
+context_graph_builder = StateGraph(ChatState)
+context_graph_builder.add_node("query_classifier", query_classifier_node)
+context_graph_builder.add_node("retrieve_context", retrieval_node)
+context_graph_builder.set_entry_point("query_classifier")
+context_graph_builder.add_edge("query_classifier", "retrieve_context")
+context_graph_builder.add_edge("retrieve_context", END)
+context_graph = context_graph_builder.compile()
+
+def initial_state(user_query: str, df: pd.DataFrame = None) -> dict:
+    """Graph inputs pinned to one dataset version: the current snapshot, or an explicit frame."""
+    if df is None:
+        snapshot = dataset.current()
+        return {"user_query": user_query, "df": snapshot.df, "kpi_index": snapshot.index}
+    return {"user_query": user_query, "df": df, "kpi_index": get_kpi_index(df)}
+
 # ✅ Now define this AFTER graph is compiled
-def run_chat_graph(user_query: str, df: pd.DataFrame):
-    inputs = {"user_query": user_query, "context_df": df}
+def run_chat_graph(user_query: str, df: pd.DataFrame = None):
+    inputs = initial_state(user_query, df)
     outputs = chatbot_graph.invoke(inputs)
     return outputs["final_response"], outputs["context_df"]
+
+
+def stream_chat_graph(user_query: str, df: pd.DataFrame = None):
+    """
+    Streaming counterpart of run_chat_graph. Yields (event, payload) tuples:
+
+    - ("context", context_df) once classification and retrieval are done
+    - ("token", text) for every generated chunk
+    - ("done", timings) with context_s, ttft_s (time to first token) and total_s
+    """
+    started = time.perf_counter()
+    state = context_graph.invoke(initial_state(user_query, df))
+    timings = {"context_s": time.perf_counter() - started, "ttft_s": None}
+    yield "context", state["context_df"]
+
+    for token in stream_response_tokens(state):
+        if timings["ttft_s"] is None:
+            timings["ttft_s"] = time.perf_counter() - started
+        yield "token", token
+
+    timings["total_s"] = time.perf_counter() - started
+    debug_print(f"⏱️ [STREAM] context={timings['context_s']:.2f}s ttft={timings['ttft_s'] or 0:.2f}s total={timings['total_s']:.2f}s")
+    yield "done", timings
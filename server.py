@@ -0,0 +1,112 @@
+# === server.py ===
+# Async JSON API over the same LangGraph pipeline as the Streamlit app.
+# Run: uvicorn server:app --host 0.0.0.0 --port 8000
+# Point OPENAI_BASE_URL at a local stub to run it without the real API.
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+load_dotenv()
+
+# The shared KPI frame is handed out as views; writes must copy instead of mutating it
+from agents.data_loader import enable_copy_on_write
+enable_copy_on_write()
+
+# Compiled graph and the first KPI snapshot are built at import; new data is swapped in while serving
+from chatbot_graph import chatbot_graph, dataset, initial_state
+from agents.llm_clients import LLM_MAX_CONCURRENCY, close_async_client, get_async_client
+from agents.instrumentation import metrics
+
+
+class QueryRequest(BaseModel):
+    query: str
+    include_context: bool = False
+    fanout: Optional[bool] = None  # per-store concurrent generation; None = RESPONSE_FANOUT default
+
+
+class QueryResult(BaseModel):
+    response: str
+    structured: dict
+    classification_path: Optional[str] = None
+    context_rows: int
+    context: Optional[List[dict]] = None
+    latency_s: float
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_async_client()
+    dataset.start_watching()
+    yield
+    dataset.stop_watching()
+    await close_async_client()
+
+
+app = FastAPI(title="Store KPI Chatbot API", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    snapshot = dataset.current()
+    return {
+        "status": "ok",
+        "rows": len(snapshot.index),
+        "stores": len(snapshot.index.stores),
+        "dataset_version": snapshot.version,
+        "dataset_loaded_at": snapshot.loaded_at,
+        "llm_max_concurrency": LLM_MAX_CONCURRENCY,
+    }
+
+
+@app.post("/admin/reload")
+async def reload_dataset():
+    """Check for new KPI data now instead of waiting for the next poll."""
+    swapped = await asyncio.to_thread(dataset.reload)
+    return {"reloaded": swapped, "dataset_version": dataset.current().version}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Per-node latency/row histograms and token/cache counters in Prometheus text format."""
+    return metrics.render_prometheus()
+
+
+@app.get("/metrics.json")
+async def metrics_json():
+    return metrics.snapshot()
+
+
+@app.post("/query", response_model=QueryResult)
+async def query(request: QueryRequest):
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="query must not be empty")
+
+    started = time.perf_counter()
+    try:
+        inputs = initial_state(request.query)
+        if request.fanout is not None:
+            inputs["fanout"] = request.fanout
+        outputs = await chatbot_graph.ainvoke(inputs)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"❌ Error occurred: {str(e)}")
+
+    context_df = outputs["context_df"]
+    context = None
+    if request.include_context:
+        context = json.loads(context_df.to_json(orient="records", date_format="iso"))
+
+    return QueryResult(
+        response=outputs["final_response"],
+        structured=outputs["structured"],
+        classification_path=outputs.get("classification_path"),
+        context_rows=len(context_df),
+        context=context,
+        latency_s=round(time.perf_counter() - started, 4),
+    )
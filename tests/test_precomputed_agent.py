@@ -0,0 +1,99 @@
+import pandas as pd
+
+from agents.precomputed_agent import precompute_advanced_kpi_metrics
+from benchmarks.synthetic_data import make_raw_kpi_frame
+
+
+def _computed(n_stores=4, n_kpis=6, n_days=90, seed=0):
+    return precompute_advanced_kpi_metrics(make_raw_kpi_frame(n_stores, n_kpis, n_days, seed=seed))
+
+
+def test_month_start_is_not_an_anomaly():
+    df = _computed()
+    first = df[df["Date"].dt.day == 1]
+    assert not first.empty
+    assert (first["Anomaly Flag"] == 0).all()
+    assert first["Z-Score"].isna().all()
+    assert first["DoD Delta"].isna().all()
+
+
+def test_daily_values_restart_with_the_month():
+    df = _computed()
+    first = df[df["Date"].dt.day == 1]
+    pd.testing.assert_series_equal(first["Daily Actual"], first["Actual"].astype(float), check_names=False)
+    net_sales = df[df["KPI Name"] == "NET SALES"]
+    assert (net_sales["Daily Actual"] >= 0).all()
+    assert (net_sales["Rolling 7D Mean"].dropna() > 0).all()
+
+
+def test_features_follow_day_values_not_running_totals():
+    from agents.precomputed_agent import RATIO_KPIS
+
+    df = _computed(n_stores=5, n_days=60)
+    for kpi, g in df[df["KPI Name"] != "NET SALES"].groupby("KPI Name"):
+        flags = g["Anomaly Flag"]
+        assert (flags == 1).mean() < 0.15, kpi
+        assert (flags == -1).any(), kpi
+        # A running total climbs through the month; a day value does not
+        assert abs(g["KPI Value"].corr(g["Date"].dt.day)) < 0.3, kpi
+        if kpi not in RATIO_KPIS:
+            pd.testing.assert_series_equal(g["KPI Value"], g["Daily Actual"], check_names=False)
+
+    ratio = df[df["KPI Name"].isin(RATIO_KPIS)]
+    assert ratio["KPI Value"].between(0.5 * ratio["Plan"], 1.5 * ratio["Plan"]).all()
+
+
+def _raw(n_days=75):
+    raw = make_raw_kpi_frame(4, 6, n_days, seed=3)
+    raw["Date"] = pd.to_datetime(raw["Date"])
+    return raw
+
+
+def test_incremental_batches_match_full_rebuild():
+    from agents.precomputed_agent import build_checkpoint, merge_checkpoint, precompute_incremental, select_new_rows
+
+    raw = _raw()
+    cutoffs = [pd.Timestamp("2025-01-20"), pd.Timestamp("2025-02-03"), pd.Timestamp("2025-02-04"), raw["Date"].max()]
+    first = raw[raw["Date"] <= cutoffs[0]]
+    parts = [precompute_advanced_kpi_metrics(first)]
+    checkpoint = build_checkpoint(parts[0])
+
+    for lo, hi in zip(cutoffs, cutoffs[1:]):
+        # Each delivery also repeats rows already processed; they must be skipped
+        delivery = raw[(raw["Date"] > lo - pd.Timedelta(days=3)) & (raw["Date"] <= hi)]
+        new_rows = select_new_rows([delivery.iloc[:len(delivery) // 2], delivery.iloc[len(delivery) // 2:]], checkpoint)
+        assert new_rows["Date"].min() > lo
+        parts.append(precompute_incremental(new_rows, checkpoint))
+        checkpoint = merge_checkpoint(checkpoint, new_rows)
+
+    incremental = pd.concat(parts, ignore_index=True)
+    full = precompute_advanced_kpi_metrics(raw)
+    key = ["Store Name", "KPI Name", "Date"]
+    pd.testing.assert_frame_equal(
+        incremental.sort_values(key).reset_index(drop=True),
+        full.sort_values(key).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_run_incremental_appends_only_new_rows(tmp_path):
+    from agents.data_loader import compact_kpi_frame, load_kpi_data, write_arrow
+    from agents.precomputed_agent import build_checkpoint, checkpoint_path, run_incremental
+
+    raw = _raw()
+    output = str(tmp_path / "kpi_precomputed.arrow")
+    initial = precompute_advanced_kpi_metrics(raw[raw["Date"] <= "2025-01-31"])
+    write_arrow(initial, output)
+    write_arrow(build_checkpoint(initial), checkpoint_path(output))
+
+    for end in ("2025-02-10", None):
+        source = tmp_path / "raw.csv"
+        (raw if end is None else raw[raw["Date"] <= end]).to_csv(source, index=False)
+        assert run_incremental(str(source), output, chunksize=200) > 0
+    assert run_incremental(str(source), output, chunksize=200) == 0
+
+    pd.testing.assert_frame_equal(
+        load_kpi_data(output, compact=True),
+        compact_kpi_frame(precompute_advanced_kpi_metrics(raw)),
+        check_dtype=False,
+    )
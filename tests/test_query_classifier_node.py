@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import pytest
+
+import agents.query_classifier_node as classifier
+from agents.llm_backends import StubBackend, _backends, set_backend
+from agents.llm_cache import TieredCache
+
+VAGUE_QUERY = "which stores are doing badly lately"
+
+REPLY = {
+    "mentioned_kpis": ["NET SALES"],
+    "start_date": "2025-02-15",
+    "end_date": "2025-02-28",
+    "days_back": 14,
+    "important_dates": [],
+    "retrieval_strategy": "trend_analysis",
+    "store_names": [],
+    "mtd_mode": "no",
+}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    backend = StubBackend(responder=lambda messages: "Sure, here it is:\n" + json.dumps(REPLY))
+    set_backend("classifier", backend)
+    monkeypatch.setattr(classifier, "classification_cache", TieredCache("test_classification", persistent=False))
+    yield backend
+    _backends.pop("classifier", None)
+
+
+def test_vague_query_is_classified_by_the_backend_then_cached(stub):
+    out = classifier.classify_query_node({"user_query": VAGUE_QUERY})
+    assert out["classification_path"] == "llm"
+    assert len(stub.calls) == 1
+    assert VAGUE_QUERY in stub.calls[0][0]["content"]
+    structured = out["structured"]
+    assert {k: structured[k] for k in REPLY} == REPLY
+    assert structured["user_query"] == VAGUE_QUERY
+    assert "NET SALES" in structured["required_signals"]
+
+    again = classifier.classify_query_node({"user_query": VAGUE_QUERY + "?"})
+    assert again["classification_path"] == "cache"
+    assert len(stub.calls) == 1
+
+
+def test_async_path_uses_the_same_backend(stub):
+    out = asyncio.run(classifier.aclassify_query_node({"user_query": VAGUE_QUERY}))
+    assert out["classification_path"] == "llm"
+    assert out["structured"]["retrieval_strategy"] == "trend_analysis"
+    assert len(stub.calls) == 1
+
+
+def test_rule_parsable_query_skips_the_backend(stub):
+    out = classifier.classify_query_node({"user_query": "Why was Net Sales down on 26th?"})
+    assert out["classification_path"] == "rules"
+    assert out["structured"]["important_dates"] == ["2025-02-26"]
+    assert stub.calls == []
+
+
+def test_reply_without_json_is_an_error(stub):
+    stub.responder = lambda messages: "I cannot help with that."
+    with pytest.raises(ValueError):
+        classifier.classify_query_node({"user_query": VAGUE_QUERY})
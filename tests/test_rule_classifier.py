@@ -0,0 +1,85 @@
+import pytest
+
+from agents.rule_classifier import RULE_CONFIDENCE_THRESHOLD, rule_classify
+
+TODAY = "2025-02-28"
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Why was Net Sales down on 26th?",
+     {"retrieval_strategy": "causal_analysis", "important_dates": ["2025-02-26"], "mtd_mode": "no"}),
+    ("why did net sales drop yesterday",
+     {"retrieval_strategy": "causal_analysis", "important_dates": ["2025-02-27"]}),
+    ("What is the Net Sales trend of last 7 days?",
+     {"retrieval_strategy": "trend_analysis", "start_date": "2025-02-22", "end_date": TODAY, "days_back": 7}),
+    ("net sales last week",
+     {"retrieval_strategy": "trend_analysis", "start_date": "2025-02-22", "end_date": TODAY}),
+    ("Give MTD Net Sales trend",
+     {"retrieval_strategy": "trend_analysis", "start_date": "2025-02-01", "end_date": TODAY, "mtd_mode": "yes"}),
+    ("abv till date",
+     {"mentioned_kpis": ["ABV"], "retrieval_strategy": "full_range", "start_date": "2025-02-01", "mtd_mode": "yes"}),
+    ("net sales month to date",
+     {"retrieval_strategy": "full_range", "start_date": "2025-02-01", "end_date": TODAY, "mtd_mode": "yes"}),
+    ("compare net sales on 20 feb vs 25 feb",
+     {"retrieval_strategy": "compare_dates", "important_dates": ["2025-02-20", "2025-02-25"]}),
+    ("net sales on 25 feb",
+     {"retrieval_strategy": "single_date_analysis", "important_dates": ["2025-02-25"]}),
+    ("net sales on 2025-02-20",
+     {"retrieval_strategy": "single_date_analysis", "important_dates": ["2025-02-20"]}),
+    ("availability and basket builder availability yesterday",
+     {"mentioned_kpis": ["BASKET BUILDER AVAILABILITY", "AVAILABILITY"], "important_dates": ["2025-02-27"]}),
+])
+def test_confident_parses(query, expected):
+    result, confidence = rule_classify(query, today=TODAY)
+    assert confidence >= RULE_CONFIDENCE_THRESHOLD
+    for field, value in expected.items():
+        assert result[field] == value, field
+
+
+@pytest.mark.parametrize("query", [
+    # Time expressions the rules cannot resolve must not pass as understood
+    "is net sales low this week",
+    "why was net sales down last month",
+    "net sales for last quarter",
+    # A root cause without a day or range to explain
+    "why is net sales down",
+    # A number that is not part of any date (an unresolved store)
+    "net sales for store 27 yesterday",
+])
+def test_unresolved_queries_go_to_the_llm(query):
+    _, confidence = rule_classify(query, today=TODAY)
+    assert confidence < RULE_CONFIDENCE_THRESHOLD
+
+
+def test_kpi_inside_a_longer_kpi_is_not_double_counted():
+    result, _ = rule_classify("basket builder availability yesterday", today=TODAY)
+    assert result["mentioned_kpis"] == ["BASKET BUILDER AVAILABILITY"]
+
+
+def test_no_kpi_is_not_parsed():
+    assert rule_classify("how are the stores doing", today=TODAY) == (None, 0.0)
+
+
+STORES = ["GURUGRAM AMBI MALL", "GURUGRAM SOUTH CITY 1", "GURUGRAM SECTOR 14", "GURUGRAM DLF PHASE 4", "GURUGRAM SOHNA ROAD"]
+
+
+@pytest.fixture
+def resolver():
+    from agents.store_resolver import StoreResolver
+    return StoreResolver(STORES, aliases={})
+
+
+def test_unique_store_token_resolves(resolver):
+    result, confidence = rule_classify("net sales for ambi last 7 days", resolver, TODAY)
+    assert result["store_names"] == ["GURUGRAM AMBI MALL"]
+    assert confidence >= RULE_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("query", [
+    "net sales for the city last 7 days",
+    "net sales trend for all mall stores last week",
+])
+def test_ordinary_words_do_not_pick_a_store(resolver, query):
+    result, confidence = rule_classify(query, resolver, TODAY)
+    assert result["store_names"] == []
+    assert confidence < RULE_CONFIDENCE_THRESHOLD